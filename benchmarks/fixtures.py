@@ -0,0 +1,261 @@
+"""
+Offline fixtures for the benchmarks.
+
+Wikipedia pages are read from `fixtures/html/` when they have been recorded with
+`python benchmarks/fixtures.py --record`, otherwise equivalent pages are generated
+with the same markup the scraper parses. Athena results are always synthetic.
+"""
+
+import argparse
+import csv
+import io
+import os
+import random
+from typing import Dict, List, Tuple
+from urllib.parse import quote
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+HTML_DIR = os.path.join(FIXTURES_DIR, "html")
+WIKI = "https://en.wikipedia.org"
+
+# Pages recorded with `--record`, the largest hubs have the largest destination tables
+AIRPORT_LIST_PAGE = "/wiki/List_of_airports_in_the_United_States"
+RECORDED_AIRPORT_PAGES = [
+    "/wiki/Hartsfield–Jackson_Atlanta_International_Airport",
+    "/wiki/Dallas_Fort_Worth_International_Airport",
+    "/wiki/Denver_International_Airport",
+    "/wiki/O'Hare_International_Airport",
+    "/wiki/Los_Angeles_International_Airport",
+]
+RECORDED_AIRLINE_PAGES = [
+    "/wiki/Delta_Air_Lines",
+    "/wiki/Alaska_Airlines",
+    "/wiki/Southwest_Airlines",
+]
+
+
+def html_path(path: str) -> str:
+    return os.path.join(HTML_DIR, quote(path.replace("/wiki/", ""), safe="") + ".html")
+
+
+def record() -> None:
+    """Download the pages above into `fixtures/html/`"""
+    import requests
+
+    session = requests.Session()
+    session.headers.update(
+        {"User-Agent": "FlightAtlasBot/1.0 (https://github.com/winstonhoyle)"}
+    )
+    os.makedirs(HTML_DIR, exist_ok=True)
+    for path in [AIRPORT_LIST_PAGE, *RECORDED_AIRPORT_PAGES, *RECORDED_AIRLINE_PAGES]:
+        r = session.get(f"{WIKI}{path}")
+        r.raise_for_status()
+        with open(html_path(path), "w", encoding="utf-8") as f:
+            f.write(r.text)
+        print(f"Recorded {path}")
+
+
+def recorded_pages() -> List[str]:
+    """Pages in `fixtures/html/` recorded with `--record`"""
+    return [
+        path
+        for path in [
+            AIRPORT_LIST_PAGE,
+            *RECORDED_AIRPORT_PAGES,
+            *RECORDED_AIRLINE_PAGES,
+        ]
+        if os.path.exists(html_path(path))
+    ]
+
+
+def load_recorded(path: str) -> str | None:
+    if not os.path.exists(html_path(path)):
+        return None
+    with open(html_path(path), encoding="utf-8") as f:
+        return f.read()
+
+
+def iata(i: int) -> str:
+    """Deterministic three letter code for airport `i`"""
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return letters[i // 676 % 26] + letters[i // 26 % 26] + letters[i % 26]
+
+
+def point(rng: random.Random) -> Tuple[float, float]:
+    return round(rng.uniform(-160, -70), 5), round(rng.uniform(20, 65), 5)
+
+
+def dms(value: float, positive: str, negative: str) -> str:
+    hemisphere = positive if value >= 0 else negative
+    value = abs(value)
+    degrees = int(value)
+    minutes = int((value - degrees) * 60)
+    seconds = round((value - degrees - minutes / 60) * 3600)
+    return f"{degrees}°{minutes}′{seconds}″{hemisphere}"
+
+
+def airport_list_page(n_airports: int) -> str:
+    rows = [
+        "<tr><th>City</th><th>FAA</th><th>IATA</th><th>ICAO</th>"
+        "<th>Airport</th><th>Role</th><th>Enplanements</th></tr>"
+    ]
+    for i in range(n_airports):
+        code = iata(i)
+        rows.append(
+            f"<tr><td>City {i}</td><td>{code}</td><td>{code}</td><td>K{code}</td>"
+            f'<td><a href="/wiki/Airport_{code}">Airport {code}</a></td>'
+            f"<td>P-L</td><td>{(n_airports - i) * 1000:,}</td></tr>"
+        )
+    return (
+        '<html><body><table class="wikitable sortable"><tbody>'
+        + "".join(rows)
+        + "</tbody></table></body></html>"
+    )
+
+
+def airport_page(code: str, rng: random.Random, destinations: List[str] = ()) -> str:
+    """Airport page with coordinates, IATA code and a destination table"""
+    lon, lat = point(rng)
+    rows = ["<tr><th>Airlines</th><th>Destinations</th><th>Refs</th></tr>"]
+    for n, (airline, dsts) in enumerate(destinations):
+        links = ", ".join(
+            f'<a href="/wiki/{dst}">{dst.replace("_", " ")}</a>' for dst in dsts
+        )
+        rows.append(
+            f'<tr><td><a href="/wiki/{airline}">{airline.replace("_", " ")}</a></td>'
+            f"<td>{links}"
+            f'<sup><a href="#cite_note-{n}">[{n}]</a></sup></td>'
+            f'<td><a href="#cite_note-{n}">[{n}]</a></td></tr>'
+        )
+    return (
+        "<html><body>"
+        f'<span class="latitude">{dms(lat, "N", "S")}</span>'
+        f'<span class="longitude">{dms(lon, "E", "W")}</span>'
+        f'<a href="/wiki/IATA_airport_code">IATA</a>: <span>{code}</span>'
+        '<h2 id="Airlines_and_destinations">Airlines and destinations</h2>'
+        '<table class="wikitable sortable"><tbody>'
+        + "".join(rows)
+        + "</tbody></table></body></html>"
+    )
+
+
+def airline_page(code: str, paragraphs: int = 300) -> str:
+    """Airline page with its code infobox ahead of an article sized body"""
+    body = "".join(
+        f'<p>Paragraph {n} about the <a href="/wiki/Airline_history_{n}">history</a>'
+        f' of the airline<sup><a href="#cite_note-{n}">[{n}]</a></sup>.</p>'
+        for n in range(paragraphs)
+    )
+    return (
+        '<html><body><table class="infobox-airline-codes">'
+        "<tr><th>IATA</th><th>ICAO</th><th>Callsign</th></tr>"
+        f"<tr><td>{code}</td><td>{code}X</td><td>CALL</td></tr>"
+        f"</table>{body}</body></html>"
+    )
+
+
+def scraper_pages(
+    n_airports: int = 500,
+    n_airlines: int = 40,
+    n_international: int = 100,
+    hub_rows: int = 400,
+    destinations_per_row: int = 15,
+    seed: int = 0,
+) -> Dict[str, str]:
+    """
+    Returns url -> html for every page one hub and the airport list need
+
+    The hub page is `Airport_AAA`, its destination table links to US airports,
+    international airports (not in the list) and airline pages. Like a real hub
+    each airline has several rows (mainline, regional, seasonal, charter).
+    """
+    rng = random.Random(seed)
+    us = [f"Airport_{iata(i)}" for i in range(n_airports)]
+    intl = [f"Airport_{iata(n_airports + i)}" for i in range(n_international)]
+    airlines = [f"Airline_{i}" for i in range(n_airlines)]
+
+    destinations = [
+        (
+            airlines[row % n_airlines],
+            rng.sample(us + intl, min(destinations_per_row, len(us + intl))),
+        )
+        for row in range(hub_rows)
+    ]
+    pages = {
+        f"{WIKI}{AIRPORT_LIST_PAGE}": load_recorded(AIRPORT_LIST_PAGE)
+        or airport_list_page(n_airports),
+        f"{WIKI}/wiki/{us[0]}": airport_page(iata(0), rng, destinations),
+    }
+    for page in us[1:] + intl:
+        pages[f"{WIKI}/wiki/{page}"] = airport_page(page[-3:], rng)
+    for i, airline in enumerate(airlines):
+        pages[f"{WIKI}/wiki/{airline}"] = airline_page(iata(i)[1:])
+
+    # Recorded hubs and airlines are benchmarked as is
+    for path in RECORDED_AIRPORT_PAGES + RECORDED_AIRLINE_PAGES:
+        html = load_recorded(path)
+        if html:
+            pages[f"{WIKI}{path}"] = html
+    return pages
+
+
+def routes_csv(
+    n_rows: int, n_airports: int = 800, airline_code: str = None, seed: int = 0
+) -> bytes:
+    """
+    Athena result CSV for `SELECT ... FROM flights`, every value is quoted. Rows
+    are spread over 60 airlines unless `airline_code` is given
+    """
+    rng = random.Random(seed)
+    points = {iata(i): point(rng) for i in range(n_airports)}
+    codes = list(points)
+    f = io.StringIO()
+    writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(
+        ["airline_code", "airport1", "airport2", "direction", "geometry1", "geometry2"]
+    )
+    for _ in range(n_rows):
+        airport1, airport2 = sorted(rng.sample(codes, 2))
+        writer.writerow(
+            [
+                airline_code or iata(rng.randrange(60))[1:],
+                airport1,
+                airport2,
+                # Most routes are flown both ways
+                rng.choice([1, 2, 3, 3, 3, 3]),
+                "POINT ({} {})".format(*points[airport1]),
+                "POINT ({} {})".format(*points[airport2]),
+            ]
+        )
+    return f.getvalue().encode("utf-8")
+
+
+def airports_csv(n_rows: int, seed: int = 0) -> bytes:
+    """Athena result CSV for `SELECT ... FROM airports`"""
+    rng = random.Random(seed)
+    f = io.StringIO()
+    writer = csv.writer(f, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    writer.writerow(["faa", "iata", "title", "url", "geometry", "destinations"])
+    for i in range(n_rows):
+        code = iata(i)
+        writer.writerow(
+            [
+                code,
+                code,
+                f"Airport {code}",
+                f"{WIKI}/wiki/Airport_{code}",
+                "POINT ({} {})".format(*point(rng)),
+                rng.randrange(1, 200),
+            ]
+        )
+    return f.getvalue().encode("utf-8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--record", action="store_true", help="Record Wikipedia pages (needs network)"
+    )
+    args = parser.parse_args()
+    if args.record:
+        record()
@@ -0,0 +1,382 @@
+"""
+Offline benchmarks for the scraper, route assembly and Lambda hot paths.
+
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --compare results.json
+
+Results are written as JSON so runs can be compared between commits.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "ecs"), os.path.join(ROOT, "lambda")]
+os.environ.setdefault("TQDM_DISABLE", "1")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-1")
+
+import create_routes  # noqa: E402
+import fixtures  # noqa: E402
+import lambda_function  # noqa: E402
+import pandas as pd  # noqa: E402
+import pyarrow as pa  # noqa: E402
+import stubs  # noqa: E402
+from shapely.geometry import Point  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000, 200_000]
+AIRPORTS_ROWS = 3_000
+
+
+def timeit(fn: Callable, repeat: int, warmup: int = 1) -> Dict:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.fmean(timings),
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+    }
+
+
+def scraper_benchmarks(repeat: int) -> List[Dict]:
+    pages = fixtures.scraper_pages()
+    create_routes.session = stubs.FakeSession(pages)
+    create_routes.wikipedia.page = stubs.fake_wikipedia_page
+
+    results = []
+    hubs = [f"{fixtures.WIKI}/wiki/Airport_{fixtures.iata(0)}"]
+    hubs += [f"{fixtures.WIKI}{path}" for path in fixtures.RECORDED_AIRPORT_PAGES]
+    for url in hubs:
+        if url not in pages:
+            continue
+        rows = len(create_routes.find_destination_table(url))
+        results.append(
+            {
+                "name": "scraper.find_destination_table",
+                "params": {"page": url.rsplit("/", 1)[-1], "rows": rows},
+                **timeit(lambda: create_routes.find_destination_table(url), repeat),
+            }
+        )
+
+    # Recorded airline infoboxes when present, otherwise generated ones
+    airline_urls = [
+        f"{fixtures.WIKI}{path}"
+        for path in fixtures.RECORDED_AIRLINE_PAGES
+        if f"{fixtures.WIKI}{path}" in pages
+    ] or [f"{fixtures.WIKI}/wiki/Airline_{i}" for i in range(3)]
+    for url in airline_urls:
+        name = url.rsplit("/", 1)[-1]
+
+        # Codes are cached by airline name, parse the page every time
+        def get_airline_code(url: str = url, name: str = name) -> str:
+            create_routes.airline_codes_dict.pop(name, None)
+            return create_routes.get_airline_code(url, name)
+
+        results.append(
+            {
+                "name": "scraper.get_airline_code",
+                "params": {"page": name, "bytes": len(pages[url].encode())},
+                **timeit(get_airline_code, repeat),
+            }
+        )
+        create_routes.airline_codes_dict.pop(name, None)
+
+    airports_df = create_routes.get_usa_airports()
+    results.append(
+        {
+            "name": "scraper.get_usa_airports",
+            "params": {"airports": len(airports_df)},
+            **timeit(create_routes.get_usa_airports, repeat=1, warmup=0),
+        }
+    )
+
+    # Hub lists US airports, international ones and unknown airlines
+    src_iata = fixtures.iata(0)
+
+    def get_destinations():
+        create_routes.additional_destinations.clear()
+        return create_routes.get_destinations(src_iata, airports_df)
+
+    results.append(
+        {
+            "name": "scraper.get_destinations",
+            "params": {"routes": len(get_destinations())},
+            **timeit(get_destinations, repeat),
+        }
+    )
+    return results
+
+
+def assembly_benchmarks(sizes: List[int], repeat: int) -> List[Dict]:
+    rows = [
+        {"IATA": fixtures.iata(i), "geometry": Point(-100 - i / 100, 40 + i / 100)}
+        for i in range(1_000)
+    ]
+    usa_airports_df = pd.DataFrame(rows[:800])
+    additional_airports_df = pd.DataFrame(rows[800:])
+    codes = [row["IATA"] for row in rows]
+    airport_geometries = create_routes.build_airport_geometries(
+        usa_airports_df, additional_airports_df
+    )
+
+    results = []
+    with tempfile.TemporaryDirectory() as spill_dir:
+        for size in sizes:
+            routes = [
+                [fixtures.iata(i % 60)[1:], codes[i % 800], codes[(i * 7 + 1) % 1_000]]
+                for i in range(size)
+            ]
+
+            def accumulate(routes: List = routes) -> create_routes.RouteAccumulator:
+                accumulator = create_routes.RouteAccumulator(
+                    path=os.path.join(spill_dir, f"routes-{size}.parquet")
+                )
+                accumulator.extend(routes)
+                accumulator.close()
+                return accumulator
+
+            accumulator = accumulate()
+            pairs_df = create_routes.build_route_pairs_df(accumulator.iter_batches())
+            routes_df = create_routes.expand_route_pairs(pairs_df)
+
+            def assemble():
+                pairs_table = pa.Table.from_pandas(pairs_df, preserve_index=False)
+                for batch in pairs_table.to_batches(
+                    max_chunksize=create_routes.ROUTE_BATCH_SIZE
+                ):
+                    create_routes.add_route_geometries(
+                        batch, airport_geometries, 2026, 1
+                    )
+
+            # Previous month with every tenth route dropped and as many new ones
+            previous = [route for i, route in enumerate(routes) if i % 10]
+            previous += [[route[0], route[2], route[1]] for route in routes[::10]]
+            previous_routes_df = pd.DataFrame(
+                previous, columns=create_routes.ROUTE_KEYS
+            )
+            previous_routes_df["src_geometry"] = previous_routes_df["src_airport"].map(
+                airport_geometries
+            )
+            previous_routes_df["dst_geometry"] = previous_routes_df["dst_airport"].map(
+                airport_geometries
+            )
+
+            for name, fn in [
+                ("assembly.accumulate_routes", accumulate),
+                (
+                    "assembly.build_route_pairs_df",
+                    lambda: create_routes.build_route_pairs_df(
+                        accumulator.iter_batches()
+                    ),
+                ),
+                (
+                    "assembly.expand_route_pairs",
+                    lambda: create_routes.expand_route_pairs(pairs_df),
+                ),
+                ("assembly.add_route_geometries", assemble),
+                (
+                    "assembly.build_route_index",
+                    lambda: create_routes.build_route_index(pairs_df),
+                ),
+                (
+                    "assembly.build_airlines_df",
+                    lambda: create_routes.build_airlines_df(pairs_df),
+                ),
+                (
+                    "assembly.build_route_changes_df",
+                    lambda: create_routes.build_route_changes_df(
+                        routes_df, previous_routes_df, airport_geometries
+                    ),
+                ),
+            ]:
+                results.append(
+                    {"name": name, "params": {"rows": size}, **timeit(fn, repeat)}
+                )
+    return results
+
+
+def lambda_benchmarks(sizes: List[int], repeat: int) -> List[Dict]:
+    lambda_function.athena = stubs.FakeAthena(bucket="results")
+    lambda_function.glue = stubs.FakeGlue(year=2026, month=1)
+    lambda_function.latest_snapshot = None
+
+    results = []
+    for size in sizes:
+        # Every row is for the queried airline, as Athena would return it
+        body = fixtures.routes_csv(size, airline_code="AA")
+        lambda_function.s3 = stubs.FakeS3(body)
+
+        def build():
+            rows = lambda_function.get_query_results(bucket="results", key="q.csv")
+            routes = lambda_function.expand_route_pairs(rows)
+            return json.dumps(lambda_function.build_line_geojson(routes))
+
+        def parse():
+            return lambda_function.get_query_results(bucket="results", key="q.csv")
+
+        rows = parse()
+        routes = lambda_function.expand_route_pairs(rows)
+        geojson = lambda_function.build_line_geojson(routes)
+        for name, fn in [
+            ("lambda.get_query_results", parse),
+            (
+                "lambda.expand_route_pairs",
+                lambda: lambda_function.expand_route_pairs(rows),
+            ),
+            (
+                "lambda.build_line_geojson",
+                lambda: lambda_function.build_line_geojson(routes),
+            ),
+            ("lambda.json_dumps", lambda: json.dumps(geojson)),
+            ("lambda.routes_response", build),
+        ]:
+            results.append(
+                {
+                    "name": name,
+                    "params": {"rows": size, "csv_bytes": len(body)},
+                    **timeit(fn, repeat),
+                }
+            )
+
+        # Full handler, a cache miss followed by cache hits against the same table
+        lambda_function.dynamo_table = stubs.FakeTable()
+        event = {"rawPath": "/routes", "queryStringParameters": {"airline_code": "AA"}}
+        miss = lambda_function.lambda_handler(event, None)
+        assert miss["statusCode"] == 202, miss
+        hit = lambda_function.lambda_handler(event, None)
+        assert len(json.loads(hit["body"])["features"]) == len(routes), hit["body"][
+            :200
+        ]
+        results.append(
+            {
+                "name": "lambda.lambda_handler.cache_hit",
+                "params": {"rows": size, "csv_bytes": len(body)},
+                **timeit(lambda: lambda_function.lambda_handler(event, None), repeat),
+            }
+        )
+
+        def cache_miss():
+            lambda_function.dynamo_table = stubs.FakeTable()
+            return lambda_function.lambda_handler(event, None)
+
+        results.append(
+            {
+                "name": "lambda.lambda_handler.cache_miss",
+                "params": {"rows": size},
+                **timeit(cache_miss, repeat),
+            }
+        )
+
+    # Airports are served whole, there are only a few thousand of them
+    body = fixtures.airports_csv(AIRPORTS_ROWS)
+    lambda_function.s3 = stubs.FakeS3(body)
+    lambda_function.dynamo_table = stubs.FakeTable()
+    event = {"rawPath": "/airports", "queryStringParameters": {}}
+    miss = lambda_function.lambda_handler(event, None)
+    assert miss["statusCode"] == 202, miss
+    hit = lambda_function.lambda_handler(event, None)
+    assert len(json.loads(hit["body"])["features"]) == AIRPORTS_ROWS, hit["body"][:200]
+    results.append(
+        {
+            "name": "lambda.lambda_handler.airports",
+            "params": {"rows": AIRPORTS_ROWS, "csv_bytes": len(body)},
+            **timeit(lambda: lambda_function.lambda_handler(event, None), repeat),
+        }
+    )
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except Exception:
+        return None
+
+
+def key(result: Dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(baseline: Dict, current: Dict) -> None:
+    """Print the median of every benchmark relative to `baseline`"""
+    previous = {key(result): result for result in baseline["results"]}
+    for result in current["results"]:
+        old = previous.get(key(result))
+        ratio = f"{result['median'] / old['median']:.2f}x" if old else "new"
+        print(f"{key(result):<90} {result['median'] * 1000:>10.2f} ms  {ratio}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--only", choices=["scraper", "assembly", "lambda"], nargs="+", default=None
+    )
+    args = parser.parse_args()
+
+    # Scraper logs every skipped link at DEBUG
+    logging.getLogger("flight_atlas").setLevel(logging.ERROR)
+    logging.getLogger().setLevel(logging.ERROR)
+
+    suites = {
+        "scraper": lambda: scraper_benchmarks(args.repeat),
+        "assembly": lambda: assembly_benchmarks(args.sizes, args.repeat),
+        "lambda": lambda: lambda_benchmarks(args.sizes, args.repeat),
+    }
+    results = []
+    for name, suite in suites.items():
+        if args.only and name not in args.only:
+            continue
+        results.extend(suite())
+
+    # Without recorded pages the scraper only parses generated markup
+    recorded_pages = fixtures.recorded_pages()
+    if (not args.only or "scraper" in args.only) and not recorded_pages:
+        print(
+            "No recorded Wikipedia pages, scraper benchmarks use generated pages. "
+            "Record them with `python benchmarks/fixtures.py --record`"
+        )
+
+    report = {
+        "commit": git_commit(),
+        "recorded_pages": recorded_pages,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    else:
+        compare({"results": []}, report)
+
+
+if __name__ == "__main__":
+    main()
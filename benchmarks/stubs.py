@@ -0,0 +1,154 @@
+"""
+In-memory stand-ins for Wikipedia and AWS so the hot paths run offline.
+"""
+
+import io
+import itertools
+import random
+import re
+import threading
+from types import SimpleNamespace
+from typing import Dict
+
+from botocore.exceptions import ClientError
+from fixtures import WIKI, airport_page, iata
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+    def raise_for_status(self) -> None:
+        pass
+
+
+class FakeSession:
+    """`requests.Session` serving fixture pages, unknown urls get a plain airport page"""
+
+    def __init__(self, pages: Dict[str, str]):
+        self.pages = pages
+        self.default = airport_page(iata(17575), random.Random(0))
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        return FakeResponse(self.pages.get(url, self.default))
+
+
+def fake_wikipedia_page(title: str, auto_suggest: bool = False, redirect: bool = True):
+    """`wikipedia.page` without the network, every title resolves to itself"""
+    return SimpleNamespace(url=f"{WIKI}/wiki/{title.replace(' ', '_')}", title=title)
+
+
+class FakeAthena:
+    """
+    Every query finishes in `state` instantly unless overridden in `states`,
+    results are served by `FakeS3`
+    """
+
+    def __init__(self, bucket: str, state: str = "SUCCEEDED"):
+        self.bucket = bucket
+        self.state = state
+        self.states = {}
+        self.started = []
+        self.ids = itertools.count()
+        self.lock = threading.Lock()
+
+    def start_query_execution(self, **kwargs) -> dict:
+        with self.lock:
+            query_id = f"query-{next(self.ids)}"
+            self.started.append(query_id)
+        return {"QueryExecutionId": query_id}
+
+    def get_query_execution(self, QueryExecutionId: str) -> dict:
+        return {
+            "QueryExecution": {
+                "Status": {"State": self.states.get(QueryExecutionId, self.state)},
+                "ResultConfiguration": {
+                    "OutputLocation": f"s3://{self.bucket}/{QueryExecutionId}.csv"
+                },
+            }
+        }
+
+
+class FakeS3:
+    """Returns the same CSV body for every Athena result key"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        return {"Body": io.BytesIO(self.body)}
+
+
+class FakeGlue:
+    def __init__(self, year: int, month: int):
+        self.partitions = [{"Values": [str(year), str(month)]}]
+
+    def get_paginator(self, name: str):
+        return SimpleNamespace(
+            paginate=lambda **kwargs: [{"Partitions": self.partitions}]
+        )
+
+
+class FakeTable:
+    """
+    DynamoDB table supporting the conditional writes and update expressions
+    the Lambda uses, thread-safe so it can stand in under concurrent load
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get_item(self, Key: dict, ConsistentRead: bool = False) -> dict:
+        with self.lock:
+            item = self.items.get(Key["query_hash"])
+        return {"Item": dict(item)} if item else {}
+
+    def check(self, item, condition, values) -> None:
+        if not condition:
+            return
+        ok = True
+        for clause in condition.split(" AND "):
+            clause = clause.strip()
+            exists = re.match(r"attribute_not_exists\((\w+)\)", clause)
+            if exists:
+                ok &= item is None or exists.group(1) not in item
+                continue
+            name, value = [part.strip() for part in clause.split("=")]
+            ok &= item is not None and item.get(name) == values[value]
+        if not ok:
+            raise ClientError(
+                {"Error": {"Code": "ConditionalCheckFailedException"}}, "Conditional"
+            )
+
+    def put_item(
+        self, Item: dict, ConditionExpression=None, ExpressionAttributeValues=None
+    ) -> dict:
+        with self.lock:
+            current = self.items.get(Item["query_hash"])
+            self.check(current, ConditionExpression, ExpressionAttributeValues or {})
+            self.items[Item["query_hash"]] = dict(Item)
+        return {}
+
+    def update_item(
+        self,
+        Key: dict,
+        UpdateExpression: str,
+        ExpressionAttributeValues: dict = None,
+        ExpressionAttributeNames: dict = None,
+        ConditionExpression: str = None,
+    ) -> dict:
+        values = ExpressionAttributeValues or {}
+        names = ExpressionAttributeNames or {}
+        set_part, _, remove_part = UpdateExpression.partition(" REMOVE ")
+        with self.lock:
+            item = self.items.get(Key["query_hash"])
+            self.check(item, ConditionExpression, values)
+            item = item if item is not None else dict(Key)
+            for assignment in set_part.replace("SET ", "", 1).split(","):
+                name, value = [part.strip() for part in assignment.split("=")]
+                item[names.get(name, name)] = values[value]
+            for name in filter(None, (n.strip() for n in remove_part.split(","))):
+                item.pop(names.get(name, name), None)
+            self.items[Key["query_hash"]] = item
+        return {}
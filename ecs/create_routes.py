@@ -1,16 +1,24 @@
+import json
 import logging
 import os
 import re
+import tempfile
 import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Tuple
-from urllib.parse import unquote
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+from urllib.parse import unquote, urlparse
 
 import boto3
 import numpy as np
 import pandas as pd
 import pyarrow as pa
+import pyarrow.compute as pc
 import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import requests
 import wikipedia
 from bs4 import BeautifulSoup
@@ -41,12 +49,127 @@ S3_RESULTS_BUCKET = os.environ.get(
 S3_PREFIX = os.environ.get("S3_PREFIX", "flights")
 REGION = os.environ.get("REGION", "us-west-1")
 DATABASE = os.environ.get("ATHENA_DB", "flights_db")
+GLUE_PARTITION_BATCH_SIZE = 100
+ROUTE_BATCH_SIZE = int(os.environ.get("ROUTE_BATCH_SIZE", "50000"))
+ROUTES_SPILL_DIR = os.environ.get("ROUTES_SPILL_DIR", tempfile.gettempdir())
+S3_ROUTE_INDEX_PREFIX = os.environ.get("S3_ROUTE_INDEX_PREFIX", "route_index")
+
+# Metrics vars
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "FlightAtlas/Build")
+METRICS_LOG_GROUP = os.environ.get("METRICS_LOG_GROUP", "/ecs/flights-scraper")
+
+# Aws objects
+glue = boto3.client("glue", region_name=REGION)
+logs = boto3.client("logs", region_name=REGION)
+s3 = boto3.client("s3", region_name=REGION)
+
+
+def add_emf_header(request, **kwargs) -> None:
+    """CloudWatch only extracts embedded metrics from `PutLogEvents` with this header"""
+    request.headers["x-amzn-logs-format"] = "json/emf"
+
+
+logs.meta.events.register("before-sign.logs.PutLogEvents", add_emf_header)
+
+
+class Metrics:
+    """
+    Build timings and counters emitted as CloudWatch Embedded Metric Format,
+    does nothing unless `METRICS_ENABLED`
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.values = defaultdict(list)
+        self.counts = defaultdict(int)
+        self.log_stream = None
+
+    def record(
+        self, name: str, value: float, unit: str = "Milliseconds", **dimensions
+    ) -> None:
+        if self.enabled:
+            self.values[(name, unit, tuple(sorted(dimensions.items())))].append(value)
+
+    def increment(self, name: str, **dimensions) -> None:
+        if self.enabled:
+            self.counts[(name, "Count", tuple(sorted(dimensions.items())))] += 1
+
+    @contextmanager
+    def span(self, name: str, **dimensions):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000, **dimensions)
+
+    def flush(self) -> None:
+        if not self.enabled or not (self.values or self.counts):
+            return
+
+        timestamp = int(time.time() * 1000)
+        metrics = [*self.values.items()]
+        metrics += [(key, [count]) for key, count in self.counts.items()]
+        self.values.clear()
+        self.counts.clear()
+
+        events = []
+        for (name, unit, dimensions), values in metrics:
+            # EMF allows at most 100 values per metric
+            for i in range(0, len(values), 100):
+                document = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": METRICS_NAMESPACE,
+                                "Dimensions": [[key for key, _ in dimensions]],
+                                "Metrics": [{"Name": name, "Unit": unit}],
+                            }
+                        ],
+                    },
+                    **dict(dimensions),
+                    name: values[i : i + 100],
+                }
+                events.append({"timestamp": timestamp, "message": json.dumps(document)})
+
+        try:
+            if not self.log_stream:
+                self.log_stream = f"metrics/{datetime.now():%Y-%m-%d}/{uuid.uuid4()}"
+                logs.create_log_stream(
+                    logGroupName=METRICS_LOG_GROUP, logStreamName=self.log_stream
+                )
+            for i in range(0, len(events), 1_000):
+                logs.put_log_events(
+                    logGroupName=METRICS_LOG_GROUP,
+                    logStreamName=self.log_stream,
+                    logEvents=events[i : i + 1_000],
+                )
+        except Exception as e:
+            logger.error(f"Unable to Emit Metrics, Exception: {str(e)}")
+
+
+metrics = Metrics()
+
+
+def record_response(response: requests.Response, *args, **kwargs) -> None:
+    """Session hook recording latency and size of every HTTP call per host"""
+    host = urlparse(response.url).netloc
+    metrics.record("http_latency", response.elapsed.total_seconds() * 1000, host=host)
+    metrics.record("http_bytes", len(response.content), unit="Bytes", host=host)
+    metrics.increment("http_requests", host=host, status=str(response.status_code))
+
 
 # Create session
 session = requests.Session()
 session.headers.update(
     {"User-Agent": "FlightAtlasBot/1.0 (https://github.com/winstonhoyle)"}
 )
+if metrics.enabled:
+    session.hooks["response"].append(record_response)
 
 # Airport code dict because many airlines do not have an IATA code on wikipedia
 airline_codes_dict = {
@@ -74,10 +197,93 @@ airline_codes_dict = {
 
 additional_destinations = {}
 
+# Hive partitions written per Glue table, partition values -> S3 location
+written_partitions = {
+    "flights": {},
+    "airports": {},
+    "airlines": {},
+    "route_changes": {},
+    "route_change_summary": {},
+}
+
+# Columns identifying a route across snapshots
+ROUTE_KEYS = ["airline_code", "src_airport", "dst_airport"]
+
+# Scraped routes, codes repeat constantly so they are dictionary encoded
+CODE_TYPE = pa.dictionary(pa.int32(), pa.string())
+ROUTES_SCHEMA = pa.schema([(key, CODE_TYPE) for key in ROUTE_KEYS])
+
+# Routes are stored once per airline and airport pair, airport1 < airport2
+PAIR_KEYS = ["airline_code", "airport1", "airport2"]
+
+# Direction flags of a pair, both directions is the two flags combined
+DIRECTION_FORWARD = 1  # airport1 -> airport2
+DIRECTION_REVERSE = 2  # airport2 -> airport1
+
+# Pairs as written to the flights dataset
+FLIGHTS_SCHEMA = pa.schema(
+    [(key, pa.string()) for key in PAIR_KEYS]
+    + [
+        ("direction", pa.int32()),
+        ("geometry1", pa.string()),
+        ("geometry2", pa.string()),
+        ("year", pa.int64()),
+        ("month", pa.int64()),
+    ]
+)
+
+
+class RouteAccumulator:
+    """
+    Collects scraped routes into fixed-size Arrow record batches, spilling every
+    full batch to a local parquet file so the crawl never holds all routes in memory
+    """
+
+    def __init__(self, path: str, batch_size: int = ROUTE_BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = {key: [] for key in ROUTE_KEYS}
+        self.writer = None
+        self.num_rows = 0
+
+    def extend(self, routes: List) -> None:
+        for route in routes:
+            for key, value in zip(ROUTE_KEYS, route):
+                self.pending[key].append(value)
+            if len(self.pending["airline_code"]) >= self.batch_size:
+                self.spill()
+
+    def spill(self) -> None:
+        if not self.pending["airline_code"]:
+            return
+        batch = pa.RecordBatch.from_arrays(
+            [
+                pa.array(self.pending[key], pa.string()).dictionary_encode()
+                for key in ROUTE_KEYS
+            ],
+            schema=ROUTES_SCHEMA,
+        )
+        if not self.writer:
+            self.writer = pq.ParquetWriter(self.path, ROUTES_SCHEMA)
+        self.writer.write_batch(batch)
+        self.num_rows += batch.num_rows
+        self.pending = {key: [] for key in ROUTE_KEYS}
+
+    def close(self) -> None:
+        self.spill()
+        if not self.writer:
+            self.writer = pq.ParquetWriter(self.path, ROUTES_SCHEMA)
+        self.writer.close()
+
+    def iter_batches(self) -> Iterator[pa.RecordBatch]:
+        """Yields the spilled routes a batch at a time, still dictionary encoded"""
+        yield from pq.ParquetFile(self.path).iter_batches(batch_size=self.batch_size)
+
 
 def get_airport_information(url: str) -> Tuple[str, Point]:
     r = session.get(url)
-    soup = BeautifulSoup(r.text, "html.parser")
+    with metrics.span("parse_duration", page="airport"):
+        soup = BeautifulSoup(r.text, "html.parser")
 
     try:
         # Get Point first
@@ -101,7 +307,8 @@ def get_airline_code(url: str, name: str) -> str:
         return airline_codes_dict[name]
     else:
         r = session.get(url)
-        soup = BeautifulSoup(r.text, "html.parser")
+        with metrics.span("parse_duration", page="airline"):
+            soup = BeautifulSoup(r.text, "html.parser")
         try:
             airline_code_table = soup.find_all(
                 "table", {"class": "infobox-airline-codes"}
@@ -120,7 +327,8 @@ def get_airline_code(url: str, name: str) -> str:
 def get_coordinate(url: str) -> Point:
     try:
         airport_r = session.get(url)
-        soup = BeautifulSoup(airport_r.text, "html.parser")
+        with metrics.span("parse_duration", page="airport"):
+            soup = BeautifulSoup(airport_r.text, "html.parser")
         lat = round(parse(soup.find("span", {"class": "latitude"}).text), 5)
         lon = round(parse(soup.find("span", {"class": "longitude"}).text), 5)
         return Point(lon, lat)
@@ -131,7 +339,8 @@ def get_coordinate(url: str) -> Point:
 
 def find_destination_table(url: str) -> List:
     r = session.get(url)
-    soup = BeautifulSoup(r.text, "html.parser")
+    with metrics.span("parse_duration", page="destinations"):
+        soup = BeautifulSoup(r.text, "html.parser")
     header = soup.find(
         lambda tag: (
             tag.name
@@ -196,10 +405,16 @@ def get_destinations(src_iata: str, airports_df: pd.DataFrame) -> List:
 
                 # If Airline already exists in dict
                 if airline_name in airline_codes_dict:
+                    metrics.increment(
+                        "cache_lookups", cache="airline_code", result="hit"
+                    )
                     airline_code = airline_codes_dict[airline_name]
 
                 # If airline doesn't exist get code and `get_airline_code` as it to `airline_codes_dict`
                 else:
+                    metrics.increment(
+                        "cache_lookups", cache="airline_code", result="miss"
+                    )
                     airline_href = a.attrs["href"]
                     airline_url = f"https://en.wikipedia.org{unquote(airline_href)}"
                     airline_name = re.sub(r"\[\d+\]", "", td.text.strip())
@@ -237,22 +452,30 @@ def get_destinations(src_iata: str, airports_df: pd.DataFrame) -> List:
                         continue
 
                     # Ensure airport url is original, lots of redirects on wikipedia
-                    page = wikipedia.page(
-                        unquote_href.replace("/wiki/", "").replace("_", " "),
-                        auto_suggest=False,
-                        redirect=True,
-                    )
+                    with metrics.span("wikipedia_page_duration"):
+                        page = wikipedia.page(
+                            unquote_href.replace("/wiki/", "").replace("_", " "),
+                            auto_suggest=False,
+                            redirect=True,
+                        )
                     url = unquote(page.url)
                     matches = airports_df.loc[airports_df["url"] == url, "IATA"]
                     dst_iata = matches.iloc[0] if not matches.empty else None
 
                     # If code is found
                     if dst_iata:
+                        metrics.increment(
+                            "cache_lookups", cache="airport", result="hit"
+                        )
+
                         # Add destinations, code was found in original datasource, no need to add reverse route
                         destinations.append([airline_code, src_iata, dst_iata])
 
                     # If international URL already found
                     elif url in additional_destinations:
+                        metrics.increment(
+                            "cache_lookups", cache="airport", result="hit"
+                        )
                         dst_iata = additional_destinations[url]["IATA"]
 
                         # Add destinations, route exist in additional dataset add
@@ -261,6 +484,9 @@ def get_destinations(src_iata: str, airports_df: pd.DataFrame) -> List:
 
                     # No code found international or remote (Alaska)
                     else:
+                        metrics.increment(
+                            "cache_lookups", cache="airport", result="miss"
+                        )
                         logger.debug(
                             f"Adding New Airport, {airline_name} flying to {url}"
                         )
@@ -289,273 +515,697 @@ def get_destinations(src_iata: str, airports_df: pd.DataFrame) -> List:
     return destinations
 
 
-# Get all the airports in the USA
-response = session.get(
-    "https://en.wikipedia.org/wiki/List_of_airports_in_the_United_States",
-)
-response.raise_for_status()
-
-# Get headers for airports
-soup = BeautifulSoup(response.text, "html.parser")
-trs = soup.find("table", {"class": "wikitable sortable"}).find_all("tr")
-headers = [th.text.strip() for th in trs[0].find_all("th")]
-
-# Loop through airports and save data
-data = []
-points = []
-titles = []
-for tr in tqdm(trs[1:], desc="Parsing Airports"):
-    if not tr.find_all("td")[1].text:
-        continue
-    row = []
-    for i, td in enumerate(tr.find_all("td")):
-        if td.find("a") and i == 4:
-            href = unquote(td.find("a").attrs["href"])
-            page = wikipedia.page(
-                href.replace("/wiki/", "").replace("_", " "),
-                auto_suggest=False,
-                redirect=True,
+def collect_partitions(partitions: Dict) -> Callable:
+    """
+    Returns a `ds.write_dataset` file visitor recording every hive partition written
+    """
+
+    def file_visitor(written_file) -> None:
+        location = os.path.dirname(written_file.path)
+        values = tuple(
+            unquote(part.split("=", 1)[1])
+            for part in location.split("/")
+            if "=" in part
+        )
+        if not location.startswith("s3://"):
+            location = f"s3://{location}"
+        partitions[values] = f"{location}/"
+
+    return file_visitor
+
+
+def register_partitions(table: str, partitions: Dict) -> int:
+    """
+    Registers written partitions directly in Glue instead of crawling with MSCK REPAIR,
+    returns the number of partitions that failed
+    """
+    storage_descriptor = glue.get_table(DatabaseName=DATABASE, Name=table)["Table"][
+        "StorageDescriptor"
+    ]
+    partition_inputs = [
+        {
+            "Values": list(values),
+            "StorageDescriptor": {**storage_descriptor, "Location": location},
+        }
+        for values, location in partitions.items()
+    ]
+
+    # Glue accepts at most 100 partitions per request
+    batches = [
+        partition_inputs[i : i + GLUE_PARTITION_BATCH_SIZE]
+        for i in range(0, len(partition_inputs), GLUE_PARTITION_BATCH_SIZE)
+    ]
+    failed = 0
+    for batch in batches:
+        response = glue.batch_create_partition(
+            DatabaseName=DATABASE, TableName=table, PartitionInputList=batch
+        )
+        for error in response.get("Errors", []):
+            # Rerunning in the same month rewrites existing partitions
+            if error["ErrorDetail"]["ErrorCode"] == "AlreadyExistsException":
+                continue
+            failed += 1
+            logger.error(
+                f"Unable to Register Partition, table: {table}, values: {error['PartitionValues']}, Exception: {error['ErrorDetail']['ErrorMessage']}"
+            )
+
+    logger.info(
+        f"Registered {len(partition_inputs) - failed} of {len(partition_inputs)} partitions for {table}"
+    )
+    return failed
+
+
+def publish_partitions(partitions: Dict, year: int, month: int) -> bool:
+    """
+    Registers the month's tables concurrently, airlines last as the Lambda serves its
+    newest partition as the latest snapshot. Returns whether the month was published
+    """
+    with ThreadPoolExecutor(max_workers=len(partitions)) as executor:
+        futures = {
+            table: executor.submit(register_partitions, table, table_partitions)
+            for table, table_partitions in partitions.items()
+            if table_partitions and table != "airlines"
+        }
+
+    failed_tables = []
+    for table, future in futures.items():
+        try:
+            if future.result():
+                failed_tables.append(table)
+        except Exception as e:
+            failed_tables.append(table)
+            logger.error(
+                f"Failed registering partitions, table: {table}, Exception: {str(e)}"
             )
-            url = unquote(page.url)
-            row.append(url)
-            points.append(get_coordinate(url))
-            titles.append(page.title)
-        elif i == 6:
-            row.append(int(td.text.strip().replace(",", "")))
-        else:
-            row.append(td.text.strip())
-    data.append(row)
-
-# Create airports geopandas frame
-usa_airports_df = pd.DataFrame(data=data, columns=headers)
-usa_airports_df.rename(columns={"Airport": "url"}, inplace=True)
-usa_airports_df["geometry"] = points
-usa_airports_df["title"] = titles
-usa_airports_df = usa_airports_df[
-    ["FAA", "IATA", "ICAO", "url", "Role", "Enplanements", "geometry", "title"]
-]
-
-# Sort by most travelled airports so the largest airlines get queried first
-usa_airports_df = usa_airports_df.sort_values(
-    "Enplanements", ascending=False
-).reset_index(drop=True)
-
-# Loop through airports again but querying the destinations at the airport
-# Queried twice because we know the US airports now, before we were building a list
-routes = []
-failed_urls = []
-for i in tqdm(range(len(usa_airports_df)), desc="Parsing Airports"):
+
+    if failed_tables:
+        logger.error(
+            f"Not publishing snapshot {year}-{month:02d}, failed tables: {failed_tables}"
+        )
+        return False
+
     try:
-        src_iata = usa_airports_df.iloc[i]["IATA"]
-        destinations = get_destinations(src_iata=src_iata, airports_df=usa_airports_df)
-        routes.extend(destinations)
+        return not register_partitions("airlines", partitions["airlines"])
     except Exception as e:
         logger.error(
-            f"Failure getting destinations, url: {usa_airports_df.iloc[i]['url']}, Exception: {str(e)}"
+            f"Failed registering partitions, table: airlines, Exception: {str(e)}"
         )
-    time.sleep(1)
+        return False
 
-for failed_url in failed_urls:
-    logger.error(f"Failed URL: {failed_url}")
 
-# Create addtional airports df
-additional_airports_df = pd.DataFrame(
-    [airline_dict for _, airline_dict in additional_destinations.items()]
-)
+def get_usa_airports() -> pd.DataFrame:
+    """
+    Returns all the airports in the USA sorted by enplanements
+    """
+    response = session.get(
+        "https://en.wikipedia.org/wiki/List_of_airports_in_the_United_States",
+    )
+    response.raise_for_status()
+
+    # Get headers for airports
+    with metrics.span("parse_duration", page="airport_list"):
+        soup = BeautifulSoup(response.text, "html.parser")
+    trs = soup.find("table", {"class": "wikitable sortable"}).find_all("tr")
+    headers = [th.text.strip() for th in trs[0].find_all("th")]
+
+    # Loop through airports and save data
+    data = []
+    points = []
+    titles = []
+    for tr in tqdm(trs[1:], desc="Parsing Airports"):
+        if not tr.find_all("td")[1].text:
+            continue
+        row = []
+        for i, td in enumerate(tr.find_all("td")):
+            if td.find("a") and i == 4:
+                href = unquote(td.find("a").attrs["href"])
+                with metrics.span("wikipedia_page_duration"):
+                    page = wikipedia.page(
+                        href.replace("/wiki/", "").replace("_", " "),
+                        auto_suggest=False,
+                        redirect=True,
+                    )
+                url = unquote(page.url)
+                row.append(url)
+                points.append(get_coordinate(url))
+                titles.append(page.title)
+            elif i == 6:
+                row.append(int(td.text.strip().replace(",", "")))
+            else:
+                row.append(td.text.strip())
+        data.append(row)
+
+    # Create airports geopandas frame
+    usa_airports_df = pd.DataFrame(data=data, columns=headers)
+    usa_airports_df.rename(columns={"Airport": "url"}, inplace=True)
+    usa_airports_df["geometry"] = points
+    usa_airports_df["title"] = titles
+    usa_airports_df = usa_airports_df[
+        ["FAA", "IATA", "ICAO", "url", "Role", "Enplanements", "geometry", "title"]
+    ]
+
+    # Sort by most travelled airports so the largest airlines get queried first
+    return usa_airports_df.sort_values("Enplanements", ascending=False).reset_index(
+        drop=True
+    )
 
-# Create a routes df with airport-pairs and geometries
-routes_df = pd.DataFrame(routes, columns=["airline_code", "src_airport", "dst_airport"])
 
-# Join Geometries
-routes_df = routes_df.merge(
-    usa_airports_df.rename(columns={"IATA": "src_airport", "geometry": "geometry_src"})[
-        ["src_airport", "geometry_src"]
-    ],
-    on="src_airport",
-    how="left",
-)
-routes_df = routes_df.merge(
-    usa_airports_df.rename(columns={"IATA": "dst_airport", "geometry": "geometry_dst"})[
-        ["dst_airport", "geometry_dst"]
-    ],
-    on="dst_airport",
-    how="left",
-)
+def build_airport_geometries(
+    usa_airports_df: pd.DataFrame, additional_airports_df: pd.DataFrame
+) -> Dict[str, str]:
+    """
+    Returns IATA code -> WKT geometry for every known airport
+    """
+    geometries = {}
+    for airports_df in [additional_airports_df, usa_airports_df]:
+        if len(airports_df) == 0:
+            continue
+        for code, geometry in zip(airports_df["IATA"], airports_df["geometry"]):
+            if geometry is not None:
+                geometries[code] = geometry.wkt
+    return geometries
 
-if len(additional_airports_df) > 0:
-    # Join geometries for the additional routes
-    routes_df = routes_df.merge(
-        additional_airports_df.rename(
-            columns={"IATA": "dst_airport", "geometry": "geometry_dst_new"}
-        ),
-        on="dst_airport",
-        how="left",
+
+def build_route_pairs_df(batches: Iterable[pa.RecordBatch]) -> pd.DataFrame:
+    """
+    Returns each airline and airport pair once with the directions it is flown in,
+    folding the routes in a batch at a time into categorical columns
+    """
+    pairs_df = pd.DataFrame(
+        {key: pd.Categorical([]) for key in PAIR_KEYS}
+        | {"forward": pd.Series(dtype=bool), "reverse": pd.Series(dtype=bool)}
+    )
+    for batch in batches:
+        # Airline codes are None when their page couldn't be parsed
+        batch = batch.filter(
+            pc.and_(
+                pc.is_valid(batch.column("airline_code")),
+                pc.and_(
+                    pc.is_valid(batch.column("src_airport")),
+                    pc.is_valid(batch.column("dst_airport")),
+                ),
+            )
+        )
+        src_airports = batch.column("src_airport").dictionary_decode()
+        dst_airports = batch.column("dst_airport").dictionary_decode()
+        reverse = pc.greater(src_airports, dst_airports)
+        batch_df = pa.table(
+            {
+                "airline_code": batch.column("airline_code"),
+                "airport1": pc.if_else(reverse, dst_airports, src_airports),
+                "airport2": pc.if_else(reverse, src_airports, dst_airports),
+                "forward": pc.invert(reverse),
+                "reverse": reverse,
+            }
+        ).to_pandas()
+
+        # A pair is flown in a direction if any of its routes are
+        pairs_df = (
+            pd.concat([pairs_df, batch_df], ignore_index=True)
+            .groupby(PAIR_KEYS, as_index=False, observed=True)[["forward", "reverse"]]
+            .max()
+        )
+        pairs_df[PAIR_KEYS] = pairs_df[PAIR_KEYS].astype("category")
+
+    pairs_df["direction"] = (
+        np.where(pairs_df["forward"], DIRECTION_FORWARD, 0)
+        | np.where(pairs_df["reverse"], DIRECTION_REVERSE, 0)
+    ).astype("int32")
+    return pairs_df[PAIR_KEYS + ["direction"]]
+
+
+def expand_route_pairs(pairs_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns the directed routes of airport pairs, one row per direction flown,
+    with their geometries if the pairs have them
+    """
+    forward_df = pairs_df[(pairs_df["direction"] & DIRECTION_FORWARD) > 0].rename(
+        columns={
+            "airport1": "src_airport",
+            "airport2": "dst_airport",
+            "geometry1": "src_geometry",
+            "geometry2": "dst_geometry",
+        }
+    )
+    reverse_df = pairs_df[(pairs_df["direction"] & DIRECTION_REVERSE) > 0].rename(
+        columns={
+            "airport2": "src_airport",
+            "airport1": "dst_airport",
+            "geometry2": "src_geometry",
+            "geometry1": "dst_geometry",
+        }
+    )
+    routes_df = pd.concat([forward_df, reverse_df], ignore_index=True)
+    return routes_df[
+        [
+            column
+            for column in ROUTE_KEYS + ["src_geometry", "dst_geometry"]
+            if column in routes_df
+        ]
+    ]
+
+
+def build_route_index(pairs_df: pd.DataFrame) -> Dict[str, List[str]]:
+    """
+    Returns airport -> the airport1 partitions holding its pairs as airport2
+    """
+    index_df = pairs_df[["airport1", "airport2"]].drop_duplicates()
+    return {
+        str(airport): sorted(str(partition) for partition in partitions)
+        for airport, partitions in index_df.groupby("airport2", observed=True)[
+            "airport1"
+        ]
+    }
+
+
+def add_route_geometries(
+    batch: pa.RecordBatch, airport_geometries: Dict[str, str], year: int, month: int
+) -> pa.RecordBatch:
+    """
+    Returns a batch of airport pairs with WKT geometries and partition columns
+    """
+    columns = [batch.column(key).cast(pa.string()) for key in PAIR_KEYS]
+    columns.append(batch.column("direction"))
+
+    # Look up each distinct airport once then gather through the dictionary indices
+    for key in ["airport1", "airport2"]:
+        airports = batch.column(key)
+        geometries = pa.array(
+            [airport_geometries.get(code) for code in airports.dictionary.to_pylist()],
+            pa.string(),
+        )
+        columns.append(geometries.take(airports.indices))
+
+    columns.append(pa.array(np.full(batch.num_rows, year), pa.int64()))
+    columns.append(pa.array(np.full(batch.num_rows, month), pa.int64()))
+    return pa.RecordBatch.from_arrays(columns, schema=FLIGHTS_SCHEMA)
+
+
+def build_airlines_df(pairs_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns airlines sorted by their count of unique (undirected) routes
+    """
+    # Pairs are already unique per airline
+    route_counts = (
+        pairs_df.groupby("airline_code", observed=True)
+        .size()
+        .reset_index(name="route_count")
+    )
+    route_counts["airline_code"] = route_counts["airline_code"].astype(str)
+
+    # Create airline df
+    airlines_df = pd.DataFrame(
+        airline_codes_dict.items(), columns=["name", "airline_code"]
+    )
+
+    # Merge with airline names
+    airlines_df = airlines_df.merge(route_counts, on="airline_code")
+    return airlines_df.sort_values("route_count", ascending=False)
+
+
+def build_airports_df(
+    usa_airports_df: pd.DataFrame,
+    additional_airports_df: pd.DataFrame,
+    routes_df: pd.DataFrame,
+) -> pd.DataFrame:
+    """
+    Returns all airports with their count of destinations and WKT geometry
+    """
+    airports_df = pd.concat(
+        [usa_airports_df, additional_airports_df], ignore_index=True
+    )[["FAA", "IATA", "url", "geometry", "title"]]
+
+    # Merge destinations
+    unique_pairs_count = (
+        routes_df.groupby("src_airport", observed=True)["dst_airport"]
+        .nunique()
+        .reset_index()
     )
-    routes_df = routes_df.merge(
-        additional_airports_df.rename(
-            columns={"IATA": "src_airport", "geometry": "geometry_src_new"}
+    unique_pairs_count.rename(
+        columns={"src_airport": "IATA", "dst_airport": "destinations"}, inplace=True
+    )
+    airports_df = airports_df.merge(unique_pairs_count, on="IATA", how="left")
+    airports_df = airports_df.replace(np.nan, 0.0)
+    airports_df["destinations"] = airports_df["destinations"].astype(int)
+    airports_df[["FAA", "IATA", "url", "title"]] = airports_df[
+        ["FAA", "IATA", "url", "title"]
+    ].astype(str)
+
+    # Convert geometry to WKT
+    airports_df["geometry"] = airports_df["geometry"].apply(lambda g: g.wkt)
+    return airports_df
+
+
+def write_route_pairs(
+    pairs_df: pd.DataFrame,
+    airport_geometries: Dict[str, str],
+    year: int,
+    month: int,
+    partitions: Dict,
+) -> None:
+    """
+    Writes the pairs of one snapshot to the flights dataset a batch at a time
+    """
+    routes_dir = f"s3://{S3_ROUTES_BUCKET}/{S3_PREFIX}/"
+    logger.info(f"Writing Routes to to {routes_dir}")
+    ds.write_dataset(
+        (
+            add_route_geometries(batch, airport_geometries, year, month)
+            for batch in pa.Table.from_pandas(
+                pairs_df, preserve_index=False
+            ).to_batches(max_chunksize=ROUTE_BATCH_SIZE)
         ),
-        on="src_airport",
-        how="left",
+        schema=FLIGHTS_SCHEMA,
+        base_dir=routes_dir,
+        format="parquet",
+        partitioning=["year", "month", "airline_code", "airport1"],
+        partitioning_flavor="hive",
+        existing_data_behavior="overwrite_or_ignore",
+        max_partitions=10_000,
+        file_visitor=collect_partitions(partitions),
     )
 
-    # Combine geomtries to remove `None` geometries
-    routes_df["geometry_src"] = routes_df["geometry_src"].combine_first(
-        routes_df["geometry_src_new"]
+
+def write_route_index(pairs_df: pd.DataFrame, year: int, month: int) -> None:
+    """
+    Pairs live under their airport1 partition, the index lets airport queries
+    find the other partitions an airport appears in as airport2
+    """
+    route_index_key = f"{S3_ROUTE_INDEX_PREFIX}/year={year}/month={month}/index.json"
+    logger.info(f"Writing Route Index to s3://{S3_ROUTES_BUCKET}/{route_index_key}")
+    s3.put_object(
+        Bucket=S3_ROUTES_BUCKET,
+        Key=route_index_key,
+        Body=json.dumps(build_route_index(pairs_df)),
+        ContentType="application/json",
     )
-    routes_df["geometry_dst"] = routes_df["geometry_dst"].combine_first(
-        routes_df["geometry_dst_new"]
+
+
+def get_snapshots() -> List[Tuple[int, int]]:
+    """
+    Returns every registered year/month snapshot, oldest first
+    """
+    paginator = glue.get_paginator("get_partitions")
+    return sorted(
+        {
+            tuple(int(value) for value in partition["Values"][:2])
+            for page in paginator.paginate(DatabaseName=DATABASE, TableName="airlines")
+            for partition in page["Partitions"]
+        }
     )
 
-# Cast geometries and drop geometry columns
-routes_df["src_geometry"] = routes_df["geometry_src"].apply(lambda g: g.wkt)
-routes_df["dst_geometry"] = routes_df["geometry_dst"].apply(lambda g: g.wkt)
 
-# Format airlines df while we are formatting routes as we sort by airline route count
-routes_df["airport1"] = routes_df[["src_airport", "dst_airport"]].min(axis=1)
-routes_df["airport2"] = routes_df[["src_airport", "dst_airport"]].max(axis=1)
+def get_previous_snapshot(year: int, month: int) -> Tuple[int, int] | None:
+    """
+    Returns the newest year/month snapshot registered before `year`/`month`
+    """
+    snapshots = [snapshot for snapshot in get_snapshots() if snapshot < (year, month)]
+    return max(snapshots) if snapshots else None
 
-# Drop duplicate flights based on airline code
-unique_routes = routes_df.drop_duplicates(
-    subset=["airline_code", "airport1", "airport2"]
-)
 
-# Count routes per airline
-route_counts = (
-    unique_routes.groupby("airline_code").size().reset_index(name="route_count")
-)
+def read_routes_snapshot(year: int, month: int) -> pd.DataFrame:
+    """
+    Reads one snapshot of the routes dataset as directed routes, only listing
+    that month's prefix
+    """
+    snapshot_dir = f"s3://{S3_ROUTES_BUCKET}/{S3_PREFIX}/year={year}/month={month}/"
+    snapshot = ds.dataset(
+        snapshot_dir,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("airline_code", pa.string()), ("airport1", pa.string())]),
+            flavor="hive",
+        ),
+    )
+    if "direction" in snapshot.schema.names:
+        return expand_route_pairs(
+            snapshot.to_table(
+                columns=PAIR_KEYS + ["direction", "geometry1", "geometry2"]
+            ).to_pandas()
+        )
 
-# Create airline df
-airlines_df = pd.DataFrame(airline_codes_dict.items(), columns=["name", "airline_code"])
-
-# Merge with airline names
-airlines_df = airlines_df.merge(route_counts, on="airline_code")
-airlines_df = airlines_df.sort_values("route_count", ascending=False)
-
-# Back to uploading routes, clean the routes DF
-routes_df = routes_df[
-    ["airline_code", "src_airport", "dst_airport", "src_geometry", "dst_geometry"]
-]
-
-# Format date for partition
-routes_df["year"] = datetime.now().year
-routes_df["month"] = datetime.now().month
-
-# Upload routes to S3
-routes_table = pa.Table.from_pandas(routes_df)
-
-# Write partitioned dataset
-routes_dir = f"s3://{S3_ROUTES_BUCKET}/{S3_PREFIX}/"
-logger.info(f"Writing Routes to to {routes_dir}")
-
-ds.write_dataset(
-    routes_table,
-    base_dir=routes_dir,
-    format="parquet",
-    partitioning=["year", "month", "airline_code", "src_airport"],
-    partitioning_flavor="hive",
-    existing_data_behavior="overwrite_or_ignore",
-    max_partitions=10_000,
-)
+    # Snapshots written before pairs were stored once hold directed routes
+    snapshot = ds.dataset(
+        snapshot_dir,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("airline_code", pa.string()), ("src_airport", pa.string())]),
+            flavor="hive",
+        ),
+    )
+    return snapshot.to_table(
+        columns=ROUTE_KEYS + ["src_geometry", "dst_geometry"]
+    ).to_pandas()
 
-# Prepare airports DataFrame for upload
-airports_df = pd.concat([usa_airports_df, additional_airports_df], ignore_index=True)[
-    ["FAA", "IATA", "url", "geometry", "title"]
-]
 
-# Merge destinations
-unique_pairs_count = (
-    routes_df.groupby("src_airport")["dst_airport"].nunique().reset_index()
-)
-unique_pairs_count.rename(
-    columns={"src_airport": "IATA", "dst_airport": "destinations"}, inplace=True
-)
-airports_df = airports_df.merge(unique_pairs_count, on="IATA", how="left")
-airports_df = airports_df.replace(np.nan, 0.0)
-airports_df["destinations"] = airports_df["destinations"].astype(int)
-airports_df[["FAA", "IATA", "url", "title"]] = airports_df[
-    ["FAA", "IATA", "url", "title"]
-].astype(str)
-
-# Convert geometry to WKT
-airports_df["geometry"] = airports_df["geometry"].apply(lambda g: g.wkt)
-
-# Add snapshot date and partition columns
-airports_df["year"] = datetime.now().year
-airports_df["month"] = datetime.now().month
-
-# Convert to Arrow table
-airport_table = pa.Table.from_pandas(airports_df)
-
-# Write partitioned dataset
-airports_dir = f"s3://{S3_ROUTES_BUCKET}/airports/"
-logger.info(f"Writing airports to {airports_dir}")
-
-# Write dataset partitioned by year/month
-ds.write_dataset(
-    data=airport_table,
-    base_dir=airports_dir,
-    format="parquet",
-    partitioning=["year", "month"],
-    partitioning_flavor="hive",
-    existing_data_behavior="overwrite_or_ignore",
-    basename_template="part-{i}.parquet",
-    filesystem=None,
-)
+def route_keys(routes_df: pd.DataFrame) -> pd.Index:
+    """
+    Returns the unique `airline_code|src_airport|dst_airport` keys
+    """
+    keys = (
+        routes_df["airline_code"].astype(str)
+        + "|"
+        + routes_df["src_airport"].astype(str)
+        + "|"
+        + routes_df["dst_airport"].astype(str)
+    )
+    return pd.Index(keys).unique()
 
-# Upload airlines to S3
-airlines_df[["name", "airline_code"]] = airlines_df[["name", "airline_code"]].astype(
-    str
-)
-airlines_df["route_count"] = airlines_df["route_count"].astype(int)
-
-# Add snapshot date and partition columns
-airlines_df["year"] = datetime.now().year
-airlines_df["month"] = datetime.now().month
-
-# Convert to Arrow table
-airlines_table = pa.Table.from_pandas(airlines_df)
-
-# Write partitioned dataset
-airlines_dir = f"s3://{S3_ROUTES_BUCKET}/airlines/"
-logger.info(f"Writing Airlines to to {airlines_dir}")
-
-# Write dataset partitioned by year/month
-ds.write_dataset(
-    data=airlines_table,
-    base_dir=airlines_dir,
-    format="parquet",
-    partitioning=["year", "month"],
-    partitioning_flavor="hive",
-    existing_data_behavior="overwrite_or_ignore",
-    basename_template="part-{i}.parquet",
-    filesystem=None,
-)
 
-logger.info(f"Enable Tables for Athena")
-athena = boto3.client("athena", region_name=REGION)
-athena_output_dir = f"s3://{S3_RESULTS_BUCKET}/"
+def build_route_changes_df(
+    routes_df: pd.DataFrame,
+    previous_routes_df: pd.DataFrame,
+    airport_geometries: Dict[str, str],
+) -> pd.DataFrame:
+    """
+    Returns routes added and removed since the previous snapshot with geometries
+    """
+    current_keys = route_keys(routes_df)
+    previous_keys = route_keys(previous_routes_df)
+
+    # Both key sets are unique, so the differences are hash lookups of one in the other
+    added_df, removed_df = [
+        pd.DataFrame([key.split("|") for key in keys], columns=ROUTE_KEYS, dtype=str)
+        for keys in [
+            current_keys.difference(previous_keys, sort=False),
+            previous_keys.difference(current_keys, sort=False),
+        ]
+    ]
+
+    # Added routes are current so their airports are known, removed ones keep
+    # the geometry they were written with
+    added_df["src_geometry"] = added_df["src_airport"].map(airport_geometries)
+    added_df["dst_geometry"] = added_df["dst_airport"].map(airport_geometries)
+    removed_df = removed_df.merge(
+        previous_routes_df.drop_duplicates(subset=ROUTE_KEYS)[
+            ROUTE_KEYS + ["src_geometry", "dst_geometry"]
+        ],
+        on=ROUTE_KEYS,
+        how="left",
+    )
+    added_df["change"] = "added"
+    removed_df["change"] = "removed"
+    return pd.concat([added_df, removed_df], ignore_index=True)
 
-for table in ["airports", "flights", "airlines"]:
-    query = f"MSCK REPAIR TABLE {table};"
 
-    response = athena.start_query_execution(
-        QueryString=query,
-        QueryExecutionContext={"Database": DATABASE},
-        ResultConfiguration={"OutputLocation": athena_output_dir},
+def build_route_change_summary_df(route_changes_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Returns counts of added and removed routes per airline and per airport
+    """
+    summaries = []
+    for scope, column in [("airline", "airline_code"), ("airport", "src_airport")]:
+        summary_df = (
+            route_changes_df.groupby([column, "change"])
+            .size()
+            .unstack(fill_value=0)
+            .reindex(columns=["added", "removed"], fill_value=0)
+            .rename_axis(columns=None)
+            .reset_index()
+            .rename(columns={column: "code"})
+        )
+        summary_df.insert(0, "scope", scope)
+        summaries.append(summary_df)
+
+    summary_df = pd.concat(summaries, ignore_index=True)
+    summary_df[["added", "removed"]] = summary_df[["added", "removed"]].astype("int32")
+    return summary_df
+
+
+def main() -> None:
+    # Get all the airports in the USA
+    with metrics.span("stage_duration", stage="get_usa_airports"):
+        usa_airports_df = get_usa_airports()
+    metrics.flush()
+
+    # Loop through airports again but querying the destinations at the airport
+    # Queried twice because we know the US airports now, before we were building a list
+    # The spill file is removed with its directory however the crawl or fold ends
+    with tempfile.TemporaryDirectory(dir=ROUTES_SPILL_DIR) as spill_dir:
+        routes = RouteAccumulator(path=os.path.join(spill_dir, "routes.parquet"))
+        failed_urls = []
+        for i in tqdm(range(len(usa_airports_df)), desc="Parsing Airports"):
+            try:
+                src_iata = usa_airports_df.iloc[i]["IATA"]
+                with metrics.span("stage_duration", stage="get_destinations"):
+                    destinations = get_destinations(
+                        src_iata=src_iata, airports_df=usa_airports_df
+                    )
+                routes.extend(destinations)
+            except Exception as e:
+                logger.error(
+                    f"Failure getting destinations, url: {usa_airports_df.iloc[i]['url']}, Exception: {str(e)}"
+                )
+
+            # Emit as the crawl goes rather than holding hours of timings
+            if i % 50 == 49:
+                metrics.flush()
+            time.sleep(1)
+        routes.close()
+        metrics.flush()
+        logger.info(f"Spilled {routes.num_rows} Routes to {routes.path}")
+
+        # Store each airline and airport pair once with the directions it is flown in,
+        # the counts and diffs are all built from the pairs
+        with metrics.span("stage_duration", stage="build_route_pairs_df"):
+            pairs_df = build_route_pairs_df(routes.iter_batches())
+    logger.info(f"Collapsed {routes.num_rows} Routes into {len(pairs_df)} Pairs")
+
+    for failed_url in failed_urls:
+        logger.error(f"Failed URL: {failed_url}")
+
+    # Create addtional airports df
+    additional_airports_df = pd.DataFrame(
+        [airline_dict for _, airline_dict in additional_destinations.items()]
     )
-    query_execution_id = response["QueryExecutionId"]
-    logger.info(f"Athena query ({table}) started: {query_execution_id}")
+    airport_geometries = build_airport_geometries(
+        usa_airports_df=usa_airports_df,
+        additional_airports_df=additional_airports_df,
+    )
+
+    # Format airlines df while we are formatting routes as we sort by airline route count
+    with metrics.span("stage_duration", stage="build_airlines_df"):
+        airlines_df = build_airlines_df(pairs_df)
 
-    while True:
-        status = athena.get_query_execution(QueryExecutionId=query_execution_id)
-        state = status["QueryExecution"]["Status"]["State"]
+    # Format date for partition
+    year, month = datetime.now().year, datetime.now().month
 
-        if state in ["SUCCEEDED", "FAILED", "CANCELLED"]:
-            break
-        time.sleep(2)
+    # Write partitioned dataset a batch at a time
+    with metrics.span("stage_duration", stage="write_routes"):
+        write_route_pairs(
+            pairs_df, airport_geometries, year, month, written_partitions["flights"]
+        )
+    with metrics.span("stage_duration", stage="write_route_index"):
+        write_route_index(pairs_df, year, month)
+
+    # Prepare airports DataFrame for upload
+    with metrics.span("stage_duration", stage="build_airports_df"):
+        airports_df = build_airports_df(
+            usa_airports_df=usa_airports_df,
+            additional_airports_df=additional_airports_df,
+            routes_df=expand_route_pairs(pairs_df),
+        )
+
+    # Add snapshot date and partition columns
+    airports_df["year"] = year
+    airports_df["month"] = month
+
+    # Convert to Arrow table
+    airport_table = pa.Table.from_pandas(airports_df)
+
+    # Write partitioned dataset
+    airports_dir = f"s3://{S3_ROUTES_BUCKET}/airports/"
+    logger.info(f"Writing airports to {airports_dir}")
+
+    # Write dataset partitioned by year/month
+    with metrics.span("stage_duration", stage="write_airports"):
+        ds.write_dataset(
+            data=airport_table,
+            base_dir=airports_dir,
+            format="parquet",
+            partitioning=["year", "month"],
+            partitioning_flavor="hive",
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template="part-{i}.parquet",
+            filesystem=None,
+            file_visitor=collect_partitions(written_partitions["airports"]),
+        )
+
+    # Upload airlines to S3
+    airlines_df[["name", "airline_code"]] = airlines_df[
+        ["name", "airline_code"]
+    ].astype(str)
+    airlines_df["route_count"] = airlines_df["route_count"].astype(int)
+
+    # Add snapshot date and partition columns
+    airlines_df["year"] = year
+    airlines_df["month"] = month
+
+    # Convert to Arrow table
+    airlines_table = pa.Table.from_pandas(airlines_df)
+
+    # Write partitioned dataset
+    airlines_dir = f"s3://{S3_ROUTES_BUCKET}/airlines/"
+    logger.info(f"Writing Airlines to to {airlines_dir}")
+
+    # Write dataset partitioned by year/month
+    with metrics.span("stage_duration", stage="write_airlines"):
+        ds.write_dataset(
+            data=airlines_table,
+            base_dir=airlines_dir,
+            format="parquet",
+            partitioning=["year", "month"],
+            partitioning_flavor="hive",
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template="part-{i}.parquet",
+            filesystem=None,
+            file_visitor=collect_partitions(written_partitions["airlines"]),
+        )
 
-    if state == "SUCCEEDED":
-        logger.info("MSCK REPAIR TABLE completed successfully!")
+    # Diff against the previous snapshot for the changes tables
+    previous_snapshot = get_previous_snapshot(year=year, month=month)
+    if previous_snapshot:
+        logger.info(f"Computing Route Changes since {previous_snapshot}")
+        with metrics.span("stage_duration", stage="build_route_changes_df"):
+            previous_routes_df = read_routes_snapshot(*previous_snapshot)
+            route_changes_df = build_route_changes_df(
+                expand_route_pairs(pairs_df), previous_routes_df, airport_geometries
+            )
+            route_change_summary_df = build_route_change_summary_df(route_changes_df)
+
+        for table, changes_df in [
+            ("route_changes", route_changes_df),
+            ("route_change_summary", route_change_summary_df),
+        ]:
+            # Add snapshot being compared against and partition columns
+            changes_df["since_year"] = np.int32(previous_snapshot[0])
+            changes_df["since_month"] = np.int32(previous_snapshot[1])
+            changes_df["year"] = year
+            changes_df["month"] = month
+
+            # Write dataset partitioned by year/month
+            changes_dir = f"s3://{S3_ROUTES_BUCKET}/{table}/"
+            logger.info(f"Writing {table} to {changes_dir}")
+            with metrics.span("stage_duration", stage=f"write_{table}"):
+                ds.write_dataset(
+                    data=pa.Table.from_pandas(changes_df, preserve_index=False),
+                    base_dir=changes_dir,
+                    format="parquet",
+                    partitioning=["year", "month"],
+                    partitioning_flavor="hive",
+                    existing_data_behavior="overwrite_or_ignore",
+                    basename_template="part-{i}.parquet",
+                    filesystem=None,
+                    file_visitor=collect_partitions(written_partitions[table]),
+                )
     else:
-        logger.error(f"Query failed or cancelled: {state}")
+        logger.info("No Previous Snapshot, Skipping Route Changes")
+
+    logger.info(f"Enable Tables for Athena")
+
+    with metrics.span("stage_duration", stage="register_partitions"):
+        publish_partitions(written_partitions, year, month)
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
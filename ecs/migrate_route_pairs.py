@@ -0,0 +1,189 @@
+"""
+One-off migration of flights snapshots written before airline and airport pairs were
+stored once. Each month is rewritten in the pair layout with its route index, its Glue
+partitions are swapped and the directed files are deleted (the bucket is versioned).
+
+    python ecs/migrate_route_pairs.py                    # every registered snapshot
+    python ecs/migrate_route_pairs.py --snapshot 2025-09
+
+Runs with the caller's AWS credentials, which need Glue BatchDeletePartition and
+S3 DeleteObject on top of what the monthly job uses.
+"""
+
+import argparse
+from typing import Dict, List
+
+import create_routes
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+logger = create_routes.logger
+
+# Glue deletes at most 25 partitions and S3 at most 1000 objects per request
+GLUE_DELETE_BATCH_SIZE = 25
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def list_directed_keys(year: int, month: int) -> List[str]:
+    """
+    Returns the S3 keys of a snapshot still partitioned by src_airport
+    """
+    paginator = create_routes.s3.get_paginator("list_objects_v2")
+    return [
+        obj["Key"]
+        for page in paginator.paginate(
+            Bucket=create_routes.S3_ROUTES_BUCKET,
+            Prefix=f"{create_routes.S3_PREFIX}/year={year}/month={month}/",
+        )
+        for obj in page.get("Contents", [])
+        if "/src_airport=" in obj["Key"] and obj["Key"].endswith(".parquet")
+    ]
+
+
+def read_directed_routes(keys: List[str], year: int, month: int) -> pd.DataFrame:
+    """
+    Reads only the directed files, pair files from an interrupted run are skipped
+    """
+    snapshot = ds.dataset(
+        [f"{create_routes.S3_ROUTES_BUCKET}/{key}" for key in keys],
+        filesystem=fs.S3FileSystem(region=create_routes.REGION),
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("airline_code", pa.string()), ("src_airport", pa.string())]),
+            flavor="hive",
+        ),
+        partition_base_dir=f"{create_routes.S3_ROUTES_BUCKET}/{create_routes.S3_PREFIX}/year={year}/month={month}",
+    )
+    return snapshot.to_table(
+        columns=create_routes.ROUTE_KEYS + ["src_geometry", "dst_geometry"]
+    ).to_pandas()
+
+
+def get_written_geometries(routes_df: pd.DataFrame) -> Dict[str, str]:
+    """
+    Returns IATA code -> WKT geometry as the snapshot was written
+    """
+    geometries = {}
+    for airport, geometry in [
+        ("dst_airport", "dst_geometry"),
+        ("src_airport", "src_geometry"),
+    ]:
+        written_df = routes_df.dropna(subset=[geometry]).drop_duplicates(airport)
+        geometries.update(zip(written_df[airport], written_df[geometry]))
+    return geometries
+
+
+def build_pairs_from_directed(routes_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Collapses directed routes into pairs the same way the monthly job folds them
+    """
+    return create_routes.build_route_pairs_df(
+        pa.Table.from_pandas(
+            routes_df[create_routes.ROUTE_KEYS],
+            schema=create_routes.ROUTES_SCHEMA,
+            preserve_index=False,
+        ).to_batches(max_chunksize=create_routes.ROUTE_BATCH_SIZE)
+    )
+
+
+def delete_partitions(table: str, year: int, month: int) -> None:
+    """
+    Deletes every Glue partition of a snapshot so the pair partitions can replace
+    the directed ones with the same values
+    """
+    paginator = create_routes.glue.get_paginator("get_partitions")
+    values = [
+        partition["Values"]
+        for page in paginator.paginate(
+            DatabaseName=create_routes.DATABASE,
+            TableName=table,
+            Expression=f"year = {year} AND month = {month}",
+        )
+        for partition in page["Partitions"]
+    ]
+    for i in range(0, len(values), GLUE_DELETE_BATCH_SIZE):
+        response = create_routes.glue.batch_delete_partition(
+            DatabaseName=create_routes.DATABASE,
+            TableName=table,
+            PartitionsToDelete=[
+                {"Values": value} for value in values[i : i + GLUE_DELETE_BATCH_SIZE]
+            ],
+        )
+        for error in response.get("Errors", []):
+            logger.error(
+                f"Unable to Delete Partition, table: {table}, values: {error['PartitionValues']}, Exception: {error['ErrorDetail']['ErrorMessage']}"
+            )
+    logger.info(f"Deleted {len(values)} partitions for {table}")
+
+
+def delete_objects(keys: List[str]) -> None:
+    for i in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+        response = create_routes.s3.delete_objects(
+            Bucket=create_routes.S3_ROUTES_BUCKET,
+            Delete={
+                "Objects": [{"Key": key} for key in keys[i : i + S3_DELETE_BATCH_SIZE]],
+                "Quiet": True,
+            },
+        )
+        for error in response.get("Errors", []):
+            logger.error(
+                f"Unable to Delete Object, key: {error['Key']}, Exception: {error['Message']}"
+            )
+
+
+def migrate_snapshot(year: int, month: int) -> None:
+    keys = list_directed_keys(year, month)
+    if not keys:
+        logger.info(f"Snapshot {year}-{month:02d} already stores pairs, skipping")
+        return
+
+    # Rebuild the pairs from the directed routes the snapshot was written with
+    routes_df = read_directed_routes(keys, year, month)
+    pairs_df = build_pairs_from_directed(routes_df)
+    logger.info(
+        f"Snapshot {year}-{month:02d}: Collapsed {len(routes_df)} Routes into {len(pairs_df)} Pairs"
+    )
+
+    # Write the pairs next to the directed files, then swap the Glue partitions
+    partitions = {}
+    create_routes.write_route_pairs(
+        pairs_df, get_written_geometries(routes_df), year, month, partitions
+    )
+    create_routes.write_route_index(pairs_df, year, month)
+    delete_partitions("flights", year, month)
+    if create_routes.register_partitions("flights", partitions):
+        logger.error(
+            f"Snapshot {year}-{month:02d}: Keeping directed files, pair partitions failed to register"
+        )
+        return
+
+    # Directed files are only dropped once nothing points at them
+    delete_objects(keys)
+    logger.info(f"Snapshot {year}-{month:02d}: Deleted {len(keys)} directed files")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--snapshot", help="Only migrate this YYYY-MM snapshot", default=None
+    )
+    args = parser.parse_args()
+
+    if args.snapshot:
+        snapshots = [tuple(int(value) for value in args.snapshot.split("-"))]
+    else:
+        snapshots = create_routes.get_snapshots()
+
+    for year, month in snapshots:
+        try:
+            migrate_snapshot(year, month)
+        except Exception as e:
+            logger.error(
+                f"Failed migrating snapshot, snapshot: {year}-{month:02d}, Exception: {str(e)}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -24,19 +24,25 @@ resource "aws_glue_catalog_table" "flights_table" {
     output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
     compressed    = false
 
-    # Columns
+    # Columns, each airline and airport pair is stored once with airport1 < airport2
     columns {
-      name = "dst_airport"
+      name = "airport2"
       type = "string"
     }
 
+    # 1 = airport1 -> airport2, 2 = airport2 -> airport1, 3 = both
     columns {
-      name = "dst_geometry"
+      name = "direction"
+      type = "int"
+    }
+
+    columns {
+      name = "geometry1"
       type = "string"
     }
 
     columns {
-      name = "src_geometry"
+      name = "geometry2"
       type = "string"
     }
 
@@ -62,7 +68,7 @@ resource "aws_glue_catalog_table" "flights_table" {
   }
 
   partition_keys {
-    name = "src_airport"
+    name = "airport1"
     type = "string"
   }
 }
@@ -184,6 +190,152 @@ resource "aws_glue_catalog_table" "airlines_table" {
     type = "int"
   }
 
+  partition_keys {
+    name = "month"
+    type = "int"
+  }
+}
+
+############################################################
+# Glue catalog table (Athena table) - Route changes
+############################################################
+resource "aws_glue_catalog_table" "route_changes_table" {
+  name          = var.athena_route_changes_table_name
+  database_name = aws_glue_catalog_database.flights_db.name
+  table_type    = "EXTERNAL_TABLE"
+
+  parameters = {
+    "classification" = "parquet"
+    "typeOfData"     = "file"
+  }
+
+  storage_descriptor {
+    location      = "s3://${aws_s3_bucket.flights_bucket.bucket}/route_changes/"
+    input_format  = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+    output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
+    compressed    = false
+
+    # Columns
+    columns {
+      name = "airline_code"
+      type = "string"
+    }
+
+    columns {
+      name = "src_airport"
+      type = "string"
+    }
+
+    columns {
+      name = "dst_airport"
+      type = "string"
+    }
+
+    columns {
+      name = "src_geometry"
+      type = "string"
+    }
+
+    columns {
+      name = "dst_geometry"
+      type = "string"
+    }
+
+    columns {
+      name = "change"
+      type = "string"
+    }
+
+    columns {
+      name = "since_year"
+      type = "int"
+    }
+
+    columns {
+      name = "since_month"
+      type = "int"
+    }
+
+    ser_de_info {
+      name                  = "parquet"
+      serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+    }
+  }
+
+  # Partition key for snapshot
+  partition_keys {
+    name = "year"
+    type = "int"
+  }
+
+  partition_keys {
+    name = "month"
+    type = "int"
+  }
+}
+
+############################################################
+# Glue catalog table (Athena table) - Route change summary
+############################################################
+resource "aws_glue_catalog_table" "route_change_summary_table" {
+  name          = var.athena_route_change_summary_table_name
+  database_name = aws_glue_catalog_database.flights_db.name
+  table_type    = "EXTERNAL_TABLE"
+
+  parameters = {
+    "classification" = "parquet"
+    "typeOfData"     = "file"
+  }
+
+  storage_descriptor {
+    location      = "s3://${aws_s3_bucket.flights_bucket.bucket}/route_change_summary/"
+    input_format  = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat"
+    output_format = "org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat"
+    compressed    = false
+
+    # Columns
+    columns {
+      name = "scope"
+      type = "string"
+    }
+
+    columns {
+      name = "code"
+      type = "string"
+    }
+
+    columns {
+      name = "added"
+      type = "int"
+    }
+
+    columns {
+      name = "removed"
+      type = "int"
+    }
+
+    columns {
+      name = "since_year"
+      type = "int"
+    }
+
+    columns {
+      name = "since_month"
+      type = "int"
+    }
+
+    ser_de_info {
+      name                  = "parquet"
+      serialization_library = "org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe"
+    }
+  }
+
+  # Partition key for snapshot
+  partition_keys {
+    name = "year"
+    type = "int"
+  }
+
   partition_keys {
     name = "month"
     type = "int"
@@ -26,7 +26,9 @@ resource "aws_ecs_task_definition" "flights_task" {
       { name = "S3_RESULTS_BUCKET", value = aws_s3_bucket.athena_query_results.bucket },
       { name = "REGION", value = var.region },
       { name = "ATHENA_DB", value = aws_glue_catalog_database.flights_db.name },
-      { name = "S3_PREFIX", value = "flights" }
+      { name = "S3_PREFIX", value = "flights" },
+      { name = "METRICS_ENABLED", value = "true" },
+      { name = "METRICS_LOG_GROUP", value = aws_cloudwatch_log_group.flights_scraper.name }
     ]
     logConfiguration = {
       logDriver = "awslogs"
@@ -97,6 +97,36 @@ resource "aws_iam_role_policy_attachment" "ecs_task_s3_attach" {
   policy_arn = aws_iam_policy.ecs_task_s3_policy.arn
 }
 
+# Custom policy for registering partitions in Glue
+resource "aws_iam_policy" "ecs_task_glue_policy" {
+  name        = "flights_ecs_glue_policy"
+  description = "Allow ECS Task to register partitions in the flights Glue database"
+
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect = "Allow",
+        Action = [
+          "glue:GetTable",
+          "glue:GetPartitions",
+          "glue:BatchCreatePartition"
+        ],
+        Resource = [
+          "arn:aws:glue:${var.region}:${data.aws_caller_identity.current.account_id}:catalog",
+          "arn:aws:glue:${var.region}:${data.aws_caller_identity.current.account_id}:database/${aws_glue_catalog_database.flights_db.name}",
+          "arn:aws:glue:${var.region}:${data.aws_caller_identity.current.account_id}:table/${aws_glue_catalog_database.flights_db.name}/*"
+        ]
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "ecs_task_glue_attach" {
+  role       = aws_iam_role.ecs_task_execution_role.name
+  policy_arn = aws_iam_policy.ecs_task_glue_policy.arn
+}
+
 ############################################################
 # Lambda IAM Role & Policy
 ############################################################
@@ -13,9 +13,11 @@ resource "aws_lambda_function" "flights_query_lambda" {
   environment {
     variables = {
       S3_RESULTS_BUCKET = aws_s3_bucket.athena_query_results.bucket
+      S3_ROUTES_BUCKET  = aws_s3_bucket.flights_bucket.bucket
       DATABASE          = aws_glue_catalog_database.flights_db.name
       ATHENA_TABLE      = aws_glue_catalog_table.flights_table.name
       REGION            = var.region
+      METRICS_ENABLED   = "true"
     }
   }
 }
@@ -36,6 +36,16 @@ variable "athena_airlines_table_name" {
   default = "airlines"
 }
 
+variable "athena_route_changes_table_name" {
+  type    = string
+  default = "route_changes"
+}
+
+variable "athena_route_change_summary_table_name" {
+  type    = string
+  default = "route_change_summary"
+}
+
 # Dummy image so `terraform plan` works this is build with github actions and pushes
 # actual updated image for the ecs monthly job
 variable "ecs_image" {
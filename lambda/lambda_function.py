@@ -6,10 +6,13 @@ import logging
 import os
 import re
 import time
+import uuid
+from contextlib import contextmanager
 from typing import Literal, Tuple
 
 import boto3
 import geojson
+from botocore.exceptions import ClientError
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -19,18 +22,147 @@ DATABASE = os.environ.get("ATHENA_DB", "flights_db")
 S3_RESULTS_BUCKET = os.environ.get(
     "S3_RESULTS_BUCKET", "bucket-flight-atlas-query-results"
 )
+S3_ROUTES_BUCKET = os.environ.get("S3_ROUTES_BUCKET", "bucket-flight-atlas-routes")
+S3_ROUTE_INDEX_PREFIX = os.environ.get("S3_ROUTE_INDEX_PREFIX", "route_index")
 FLIGHTS_TABLE = os.environ.get("FLIGHTS_TABLE", "flights")
+AIRLINES_TABLE = os.environ.get("AIRLINES_TABLE", "airlines")
+AIRPORTS_TABLE = os.environ.get("AIRPORTS_TABLE", "airports")
+ROUTE_CHANGES_TABLE = os.environ.get("ROUTE_CHANGES_TABLE", "route_changes")
+ROUTE_CHANGE_SUMMARY_TABLE = os.environ.get(
+    "ROUTE_CHANGE_SUMMARY_TABLE", "route_change_summary"
+)
 REGION = os.environ.get("REGION", "us-west-1")
 
+# Cache vars
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+LEASE_SECONDS = int(os.environ.get("LEASE_SECONDS", "30"))
+NEGATIVE_CACHE_SECONDS = int(os.environ.get("NEGATIVE_CACHE_SECONDS", "300"))
+
+# Returned while the lease holder hasn't started the query yet, the frontend
+# keeps polling as long as `query_id` is set
+PENDING_QUERY_ID = "pending"
+
+# Metrics vars
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "FlightAtlas/Api")
+
+# Latest snapshot is looked up in Glue at most this often per warm container
+SNAPSHOT_TTL_SECONDS = int(os.environ.get("SNAPSHOT_TTL_SECONDS", "3600"))
+
+# Query planner vars, only the columns each endpoint builds its response from
+QUERY_TABLES = {
+    "/routes": FLIGHTS_TABLE,
+    "/airlines": AIRLINES_TABLE,
+    "/airports": AIRPORTS_TABLE,
+    "/changes": ROUTE_CHANGES_TABLE,
+}
+QUERY_COLUMNS = {
+    "/routes": [
+        "airline_code",
+        "airport1",
+        "airport2",
+        "direction",
+        "geometry1",
+        "geometry2",
+    ],
+    "/airlines": ["airline_code", "name"],
+    "/airports": ["faa", "iata", "title", "url", "geometry", "destinations"],
+    "/changes": [
+        "airline_code",
+        "src_airport",
+        "dst_airport",
+        "src_geometry",
+        "dst_geometry",
+        "change",
+        "year",
+        "month",
+    ],
+}
+
+# Routes are stored once per airline and airport pair (airport1 < airport2) with
+# the directions flown as flags, both directions is the two flags combined
+DIRECTION_FORWARD = 1  # airport1 -> airport2
+DIRECTION_REVERSE = 2  # airport2 -> airport1
+
+# GeoJSON properties of each route line
+ROUTE_PROPERTIES = ["airline_code", "src_airport", "dst_airport"]
+CHANGE_PROPERTIES = ROUTE_PROPERTIES + ["change", "year", "month"]
+
 # regex vars
 VALID_AIRPORT = re.compile(r"^[A-Z]{3}$")
 VALID_AIRLINE = re.compile(r"^[A-Z0-9]{2,3}$")
+VALID_SNAPSHOT = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
 
 # Aws objects
 athena = boto3.client("athena", region_name=REGION)
 s3 = boto3.client("s3", region_name=REGION)
 dynamo = boto3.resource("dynamodb", region_name=REGION)
 dynamo_table = dynamo.Table("flights-query-cache")
+glue = boto3.client("glue", region_name=REGION)
+
+# (looked up at, (year, month)) of the newest snapshot
+latest_snapshot = None
+
+# (year, month) -> airport -> airport1 partitions holding it as airport2
+route_indexes = {}
+
+
+class Metrics:
+    """
+    Phase timings of one invocation, printed as CloudWatch Embedded Metric Format
+    which Lambda extracts from the logs. Does nothing unless `METRICS_ENABLED`.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self, endpoint: str = "unknown") -> None:
+        self.dimensions = {"endpoint": endpoint, "cache": "none"}
+        self.timings = {}
+
+    def put_dimension(self, key: str, value: str) -> None:
+        self.dimensions[key] = value
+
+    def record(self, phase: str, milliseconds: float) -> None:
+        if self.enabled:
+            self.timings[phase] = self.timings.get(phase, 0.0) + milliseconds
+
+    @contextmanager
+    def span(self, phase: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, (time.perf_counter() - start) * 1000)
+
+    def flush(self) -> None:
+        if not self.enabled or not self.timings:
+            return
+        document = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": METRICS_NAMESPACE,
+                        "Dimensions": [["endpoint"], ["endpoint", "cache"]],
+                        "Metrics": [
+                            {"Name": phase, "Unit": "Milliseconds"}
+                            for phase in self.timings
+                        ],
+                    }
+                ],
+            },
+            **self.dimensions,
+            **self.timings,
+        }
+        print(json.dumps(document), flush=True)
+
+
+metrics = Metrics()
 
 
 def run_athena_query(query):
@@ -44,6 +176,91 @@ def run_athena_query(query):
     return response["QueryExecutionId"]
 
 
+def acquire_lease(query_hash: str, cached: dict | None) -> str | None:
+    """
+    Claim the right to start the Athena query for `query_hash`.
+
+    Only one concurrent invocation can win: a new entry is only written if none
+    exists, and an existing (stale or failed) entry is only replaced if it still
+    holds the lease we read. Returns the new lease id, or `None` if another
+    invocation got there first.
+    """
+    current_time = int(time.time())
+    lease_id = str(uuid.uuid4())
+
+    if not cached:
+        condition = {"ConditionExpression": "attribute_not_exists(query_hash)"}
+    elif "lease_id" in cached:
+        condition = {
+            "ConditionExpression": "lease_id = :lease",
+            "ExpressionAttributeValues": {":lease": cached["lease_id"]},
+        }
+    else:
+        # Entries written before leases existed
+        condition = {"ConditionExpression": "attribute_not_exists(lease_id)"}
+
+    try:
+        dynamo_table.put_item(
+            Item={
+                "query_hash": query_hash,
+                "lease_id": lease_id,
+                "status": "PENDING",
+                "lease_expires": current_time + LEASE_SECONDS,
+                "timestamp": current_time,
+                "ttl": current_time + CACHE_TTL_SECONDS,
+            },
+            **condition,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None
+        raise
+
+    return lease_id
+
+
+def get_latest_snapshot() -> Tuple[int, int]:
+    """Newest year/month partition, cached for warm invocations."""
+    global latest_snapshot
+    if latest_snapshot and time.time() - latest_snapshot[0] < SNAPSHOT_TTL_SECONDS:
+        return latest_snapshot[1]
+
+    # Airlines table is only partitioned by year/month so this is a small listing,
+    # and the build registers it last so its newest month is complete
+    paginator = glue.get_paginator("get_partitions")
+    snapshots = [
+        tuple(int(value) for value in partition["Values"][:2])
+        for page in paginator.paginate(DatabaseName=DATABASE, TableName=AIRLINES_TABLE)
+        for partition in page["Partitions"]
+    ]
+    if not snapshots:
+        raise LookupError(f"No snapshots registered for {AIRLINES_TABLE}")
+
+    latest_snapshot = (time.time(), max(snapshots))
+    return latest_snapshot[1]
+
+
+def get_route_index(snapshot: Tuple[int, int]) -> dict | None:
+    """Per-airport partition index of a snapshot, cached for warm invocations."""
+    if snapshot not in route_indexes:
+        year, month = snapshot
+        try:
+            index_obj = s3.get_object(
+                Bucket=S3_ROUTES_BUCKET,
+                Key=f"{S3_ROUTE_INDEX_PREFIX}/year={year}/month={month}/index.json",
+            )
+        except ClientError as e:
+            # Months not yet rewritten by ecs/migrate_route_pairs.py have no index,
+            # their airport queries can't prune airport1 partitions. Not cached so
+            # a migrated month is picked up straight away
+            if e.response["Error"]["Code"] != "NoSuchKey":
+                raise
+            logger.warning(f"No route index for snapshot {year}-{month:02d}")
+            return None
+        route_indexes[snapshot] = json.loads(index_obj["Body"].read())
+    return route_indexes[snapshot]
+
+
 def clean_param(value: str | None, pattern: re.Pattern) -> str | None:
     if not value:
         return None
@@ -64,10 +281,12 @@ def get_query_result_path(execution_id: str) -> Tuple[str, str]:
 
 def get_query_results(bucket: str, key: str) -> list:
     """Download Athena query results CSV from S3."""
-    csv_obj = s3.get_object(Bucket=bucket, Key=key)
-    csv_data = csv_obj["Body"].read().decode("utf-8")
-    reader = csv.DictReader(io.StringIO(csv_data))
-    return list(reader)
+    with metrics.span("s3_download"):
+        csv_obj = s3.get_object(Bucket=bucket, Key=key)
+        csv_data = csv_obj["Body"].read().decode("utf-8")
+    with metrics.span("csv_parse"):
+        reader = csv.DictReader(io.StringIO(csv_data))
+        return list(reader)
 
 
 def build_point_geojson(rows: list):
@@ -95,16 +314,46 @@ def build_point_geojson(rows: list):
     return geojson.FeatureCollection(features)
 
 
+def expand_route_pairs(rows: list, src_airport: str | None = None) -> list:
+    """Expand airport pair rows into one row per direction flown from `src_airport`."""
+    routes = []
+    for row in rows:
+        # Rows of months still in the directed layout have no direction
+        try:
+            direction = int(row["direction"])
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Skipping invalid row: {e}")
+            continue
+        if direction & DIRECTION_FORWARD and src_airport in [None, row["airport1"]]:
+            routes.append(
+                {
+                    "airline_code": row["airline_code"],
+                    "src_airport": row["airport1"],
+                    "dst_airport": row["airport2"],
+                    "src_geometry": row["geometry1"],
+                    "dst_geometry": row["geometry2"],
+                }
+            )
+        if direction & DIRECTION_REVERSE and src_airport in [None, row["airport2"]]:
+            routes.append(
+                {
+                    "airline_code": row["airline_code"],
+                    "src_airport": row["airport2"],
+                    "dst_airport": row["airport1"],
+                    "src_geometry": row["geometry2"],
+                    "dst_geometry": row["geometry1"],
+                }
+            )
+    return routes
+
+
 def build_line_geojson(
-    rows: list, airline_code: str | None = None
+    rows: list, properties: list = ROUTE_PROPERTIES
 ) -> geojson.FeatureCollection:
     """Convert rows to GeoJSON FeatureCollection of LineStrings."""
     features = []
     for row in rows:
         try:
-            if airline_code and row.get("airline_code") != airline_code:
-                continue
-
             dst_geom = row["dst_geometry"].replace("POINT (", "").replace(")", "")
             src_geom = row["src_geometry"].replace("POINT (", "").replace(")", "")
             dst_lon, dst_lat = map(float, dst_geom.split())
@@ -114,11 +363,7 @@ def build_line_geojson(
 
             feature = geojson.Feature(
                 geometry=line,
-                properties={
-                    "airline_code": row["airline_code"],
-                    "src_airport": row["src_airport"],
-                    "dst_airport": row["dst_airport"],
-                },
+                properties={name: row[name] for name in properties},
             )
             features.append(feature)
         except Exception as e:
@@ -127,30 +372,75 @@ def build_line_geojson(
     return geojson.FeatureCollection(features)
 
 
+def build_change_summary(rows: list) -> dict:
+    """Convert summary rows to added/removed route counts per airline and airport."""
+    summary = {"airlines": {}, "airports": {}}
+    for row in rows:
+        summary[f"{row['scope']}s"][row["code"]] = {
+            "added": int(row["added"]),
+            "removed": int(row["removed"]),
+        }
+    return summary
+
+
 def format_query(
-    path: Literal["/routes", "/airlines", "/airports"],
+    path: Literal["/routes", "/airlines", "/airports", "/changes"],
+    snapshot: Tuple[int, int],
     src_airport: str = None,
     airline_code: str = None,
+    since: Tuple[int, int] | None = None,
+    route_index: dict | None = None,
 ) -> str:
-    if path == "/routes":
-        base_query = "SELECT * FROM flights"
-        if src_airport:
-            return f"{base_query} WHERE src_airport = '{src_airport}'"
-        if airline_code:
-            return f"{base_query} WHERE airline_code = '{airline_code}'"
-
-    if path == "/airlines":
-        base_query = "SELECT * FROM airlines"
-        if airline_code:
-            return base_query + f" WHERE airline_code = '{airline_code}'"
-        else:
-            return base_query
+    """Plan the query, pinned to a single snapshot with every predicate pushed down."""
+    year, month = snapshot
+    if path == "/changes" and since:
+        # Every monthly diff after `since` up to the snapshot, which keeps the
+        # query (and its cache key) changing when a new month is built
+        since_year, since_month = since
+        predicates = [
+            f"(year > {since_year} OR (year = {since_year} AND month > {since_month}))",
+            f"(year < {year} OR (year = {year} AND month <= {month}))",
+        ]
+    else:
+        predicates = [f"year = {year}", f"month = {month}"]
+
+    # Without filters changes are served from the per airline/airport summary
+    if path == "/changes" and not src_airport and not airline_code:
+        return (
+            "SELECT scope, code, SUM(added) AS added, SUM(removed) AS removed "
+            f"FROM {ROUTE_CHANGE_SUMMARY_TABLE} WHERE {' AND '.join(predicates)} "
+            "GROUP BY scope, code"
+        )
 
-    if path == "/airports":
-        return "SELECT * FROM airports"
+    if path == "/routes" and src_airport:
+        # Pairs live under their airport1 partition, the index lists the other
+        # partitions holding the airport as airport2
+        if route_index is not None:
+            partitions = [src_airport] + [
+                airport
+                for airport in route_index.get(src_airport, [])
+                if VALID_AIRPORT.match(airport)
+            ]
+            partitions = ", ".join(f"'{airport}'" for airport in partitions)
+            predicates.append(f"airport1 IN ({partitions})")
+        predicates.append(
+            f"((airport1 = '{src_airport}' AND bitwise_and(direction, {DIRECTION_FORWARD}) > 0) "
+            f"OR (airport2 = '{src_airport}' AND bitwise_and(direction, {DIRECTION_REVERSE}) > 0))"
+        )
+    if path == "/changes" and src_airport:
+        predicates.append(f"src_airport = '{src_airport}'")
+    if path in ["/routes", "/airlines", "/changes"] and airline_code:
+        predicates.append(f"airline_code = '{airline_code}'")
+
+    columns = ", ".join(QUERY_COLUMNS[path])
+    return (
+        f"SELECT {columns} FROM {QUERY_TABLES[path]} WHERE {' AND '.join(predicates)}"
+    )
 
 
 def make_response(status_code: int, body_dict: dict) -> dict:
+    with metrics.span("json_dumps"):
+        body = json.dumps(body_dict)
     return {
         "statusCode": status_code,
         "headers": {
@@ -159,11 +449,15 @@ def make_response(status_code: int, body_dict: dict) -> dict:
             "Access-Control-Allow-Headers": "*",
             "Access-Control-Allow-Methods": "GET,OPTIONS",
         },
-        "body": json.dumps(body_dict),
+        "body": body,
     }
 
 
 def lambda_handler(event, context) -> dict:
+    # Unknown paths share one dimension value so clients can't create metrics
+    path = event.get("rawPath")
+    metrics.reset(endpoint=path if path in QUERY_TABLES else "other")
+    start = time.perf_counter()
     try:
         """Handle requests for routes by airport or airline."""
 
@@ -181,9 +475,10 @@ def lambda_handler(event, context) -> dict:
 
         # Lambda event vars
         params = event.get("queryStringParameters") or {}
-        path = event.get("rawPath")
         src_airport = clean_param(params.get("airport"), VALID_AIRPORT)
         airline_code = clean_param(params.get("airline_code"), VALID_AIRLINE)
+        as_of = clean_param(params.get("as_of"), VALID_SNAPSHOT)
+        since = clean_param(params.get("since"), VALID_SNAPSHOT)
 
         # If no codes
         if not src_airport and not airline_code and path == "/routes":
@@ -196,26 +491,56 @@ def lambda_handler(event, context) -> dict:
                 status_code=400, body_dict={"error": "No parameters for this endpoint"}
             )
 
+        if path not in QUERY_TABLES:
+            return make_response(status_code=404, body_dict={"error": "Not found"})
+
+        # Pin the requested snapshot, otherwise the latest
+        if as_of:
+            snapshot = tuple(int(value) for value in as_of.split("-"))
+        else:
+            with metrics.span("glue_snapshot"):
+                snapshot = get_latest_snapshot()
+
+        # Airport routes only scan the partitions the snapshot's index lists
+        route_index = None
+        if path == "/routes" and src_airport:
+            with metrics.span("route_index"):
+                route_index = get_route_index(snapshot)
+
         # Query params handling
         query = format_query(
-            path=path, src_airport=src_airport, airline_code=airline_code
+            path=path,
+            snapshot=snapshot,
+            src_airport=src_airport,
+            airline_code=airline_code,
+            since=tuple(int(value) for value in since.split("-")) if since else None,
+            route_index=route_index,
         )
 
-        # Create hash key for the query
+        # Create hash key for the query, the snapshot is part of the query
         query_hash = hashlib.sha256(query.encode()).hexdigest()
 
         # Check cache
-        cached = dynamo_table.get_item(Key={"query_hash": query_hash}).get("Item")
+        with metrics.span("dynamo_get"):
+            cached = dynamo_table.get_item(Key={"query_hash": query_hash}).get("Item")
 
         # If if cached
         if cached and "query_id" in cached:
             query_id = cached["query_id"]
-            exec_info = athena.get_query_execution(QueryExecutionId=query_id)
-            state = exec_info["QueryExecution"]["Status"]["State"]
+            state = cached.get("status")
+
+            # Failed queries are negative cached, only ask Athena otherwise
+            if state not in ["FAILED", "CANCELLED"]:
+                with metrics.span("athena_status"):
+                    exec_info = athena.get_query_execution(QueryExecutionId=query_id)
+                state = exec_info["QueryExecution"]["Status"]["State"]
 
             if state == "SUCCEEDED":
+                metrics.put_dimension("cache", "hit")
+
                 # Get path and update dynamo db record
-                bucket, s3_result_key = get_query_result_path(query_id)
+                with metrics.span("athena_status"):
+                    bucket, s3_result_key = get_query_result_path(query_id)
 
                 # First creation, update the s3_key for caching
                 if "s3_key" not in cached:
@@ -233,45 +558,109 @@ def lambda_handler(event, context) -> dict:
                 # Get csv data
                 rows = get_query_results(bucket=bucket, key=s3_result_key)
 
-                # Return line geojson
-                if path == "/routes":
-                    result_dict = build_line_geojson(rows, airline_code=airline_code)
-
-                # Return json
-                if path == "/airlines":
-                    result_dict = {
-                        row["airline_code"]: "Delta Air Lines"
-                        if row["name"] == "Delta Connection"
-                        else row["name"]
-                        for row in rows
-                    }
-
-                # Return points geojson
-                if path == "/airports":
-                    result_dict = build_point_geojson(rows)
+                with metrics.span("build_response"):
+                    # Return line geojson
+                    if path == "/routes":
+                        result_dict = build_line_geojson(
+                            expand_route_pairs(rows, src_airport=src_airport)
+                        )
+
+                    # Return json
+                    if path == "/airlines":
+                        result_dict = {
+                            row["airline_code"]: "Delta Air Lines"
+                            if row["name"] == "Delta Connection"
+                            else row["name"]
+                            for row in rows
+                        }
+
+                    # Return points geojson
+                    if path == "/airports":
+                        result_dict = build_point_geojson(rows)
+
+                    # Return changed routes as line geojson, otherwise the summary
+                    if path == "/changes":
+                        if src_airport or airline_code:
+                            result_dict = build_line_geojson(
+                                rows, properties=CHANGE_PROPERTIES
+                            )
+                        else:
+                            result_dict = build_change_summary(rows)
 
                 # Return data
                 return make_response(status_code=200, body_dict=result_dict)
 
             elif state in ["RUNNING", "QUEUED"]:
+                metrics.put_dimension("cache", "processing")
                 return make_response(
                     status_code=202,
                     body_dict={"status": "processing", "query_id": query_id},
                 )
 
+            # FAILED or CANCELLED, record it so it isn't re-run on every request
+            metrics.put_dimension("cache", "failed")
+            failed_at = int(cached.get("failed_at", 0))
+            if cached.get("status") != state or not failed_at:
+                failed_at = int(time.time())
+                dynamo_table.update_item(
+                    Key={"query_hash": query_hash},
+                    UpdateExpression="SET #s = :s, failed_at = :t",
+                    ExpressionAttributeValues={":s": state, ":t": failed_at},
+                    ExpressionAttributeNames={"#s": "status"},
+                )
+            if int(time.time()) - failed_at < NEGATIVE_CACHE_SECONDS:
+                return make_response(
+                    status_code=502,
+                    body_dict={
+                        "error": f"Query {state.lower()}",
+                        "query_id": query_id,
+                    },
+                )
+
+        # Another invocation holds the lease and is starting the query
+        elif cached and int(cached.get("lease_expires", 0)) > int(time.time()):
+            metrics.put_dimension("cache", "processing")
+            return make_response(
+                status_code=202,
+                body_dict={"status": "processing", "query_id": PENDING_QUERY_ID},
+            )
+
+        # Claim the lease, if lost join the query the winner started
+        with metrics.span("dynamo_lease"):
+            lease_id = acquire_lease(query_hash=query_hash, cached=cached)
+        if not lease_id:
+            metrics.put_dimension("cache", "joined")
+            winner = dynamo_table.get_item(
+                Key={"query_hash": query_hash}, ConsistentRead=True
+            ).get("Item", {})
+            return make_response(
+                status_code=202,
+                body_dict={
+                    "status": "processing",
+                    "query_id": winner.get("query_id", PENDING_QUERY_ID),
+                },
+            )
+
         # Run Athena query
-        query_id = run_athena_query(query)
-        current_time = int(time.time())
-        ttl_seconds = current_time + 7 * 24 * 60 * 60
-        dynamo_table.put_item(
-            Item={
-                "query_hash": query_hash,
-                "query_id": query_id,
-                "status": "RUNNING",
-                "timestamp": current_time,
-                "ttl": ttl_seconds,
-            }
-        )
+        metrics.put_dimension("cache", "miss")
+        with metrics.span("athena_start"):
+            query_id = run_athena_query(query)
+        try:
+            dynamo_table.update_item(
+                Key={"query_hash": query_hash},
+                UpdateExpression="SET query_id = :q, #s = :s REMOVE lease_expires",
+                ConditionExpression="lease_id = :lease",
+                ExpressionAttributeValues={
+                    ":q": query_id,
+                    ":s": "RUNNING",
+                    ":lease": lease_id,
+                },
+                ExpressionAttributeNames={"#s": "status"},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            logger.warning(f"Lease expired before query started, query: {query_id}")
         return make_response(
             status_code=202, body_dict={"status": "started", "query_id": query_id}
         )
@@ -279,3 +668,7 @@ def lambda_handler(event, context) -> dict:
     except Exception as e:
         logger.exception("Lambda failed")
         return make_response(status_code=500, body_dict={"error": str(e)})
+
+    finally:
+        metrics.record("total", (time.perf_counter() - start) * 1000)
+        metrics.flush()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [
+    os.path.join(ROOT, "ecs"),
+    os.path.join(ROOT, "lambda"),
+    os.path.join(ROOT, "benchmarks"),
+]
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-1")
@@ -0,0 +1,97 @@
+"""
+Concurrent cache misses against the in-memory DynamoDB stand-in, only one
+invocation may start the Athena query
+"""
+
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lambda_function
+import pytest
+import stubs
+
+THREADS = 32
+EVENT = {"rawPath": "/routes", "queryStringParameters": {"airline_code": "AS"}}
+
+
+@pytest.fixture
+def athena(monkeypatch):
+    athena = stubs.FakeAthena(bucket="results", state="RUNNING")
+    monkeypatch.setattr(lambda_function, "athena", athena)
+    monkeypatch.setattr(lambda_function, "glue", stubs.FakeGlue(year=2026, month=1))
+    monkeypatch.setattr(lambda_function, "latest_snapshot", None)
+    monkeypatch.setattr(lambda_function, "dynamo_table", stubs.FakeTable())
+    return athena
+
+
+def query_hash() -> str:
+    query = lambda_function.format_query(
+        path="/routes", snapshot=(2026, 1), airline_code="AS"
+    )
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+def fire(threads: int = THREADS) -> list:
+    """Calls the handler from `threads` threads released at the same moment"""
+    barrier = threading.Barrier(threads)
+
+    def call(_):
+        barrier.wait()
+        return lambda_function.lambda_handler(EVENT, None)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(call, range(threads)))
+
+
+def body(response: dict) -> dict:
+    return json.loads(response["body"])
+
+
+def test_concurrent_misses_start_one_query(athena):
+    responses = fire()
+
+    assert len(athena.started) == 1
+    for response in responses:
+        assert response["statusCode"] == 202
+        assert body(response)["query_id"] in [
+            athena.started[0],
+            lambda_function.PENDING_QUERY_ID,
+        ]
+
+
+def test_failed_query_is_negative_cached_then_retried_once(athena):
+    fire()
+    athena.states[athena.started[0]] = "FAILED"
+
+    # Inside the window every request is answered from the cache
+    for response in fire():
+        assert response["statusCode"] == 502
+    assert len(athena.started) == 1
+
+    # Once the window has passed exactly one invocation re-runs the query
+    item = lambda_function.dynamo_table.items[query_hash()]
+    item["failed_at"] -= lambda_function.NEGATIVE_CACHE_SECONDS + 1
+    for response in fire():
+        assert response["statusCode"] == 202
+    assert len(athena.started) == 2
+
+
+def test_expired_lease_is_taken_over(athena):
+    current_time = int(time.time())
+    lambda_function.dynamo_table.items[query_hash()] = {
+        "query_hash": query_hash(),
+        "lease_id": "crashed",
+        "status": "PENDING",
+        "lease_expires": current_time - 1,
+        "timestamp": current_time - lambda_function.LEASE_SECONDS,
+        "ttl": current_time + lambda_function.CACHE_TTL_SECONDS,
+    }
+
+    response = lambda_function.lambda_handler(EVENT, None)
+
+    assert response["statusCode"] == 202
+    assert athena.started == [body(response)["query_id"]]
+    assert lambda_function.dynamo_table.items[query_hash()]["lease_id"] != "crashed"
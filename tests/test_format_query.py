@@ -0,0 +1,37 @@
+"""
+Query planning, the SQL text is also the DynamoDB cache key
+"""
+
+import lambda_function
+
+
+def changes_query(snapshot: tuple, since: tuple = (2025, 10)) -> str:
+    return lambda_function.format_query(
+        path="/changes", snapshot=snapshot, since=since, airline_code="AS"
+    )
+
+
+def test_changes_since_is_bounded_by_the_snapshot():
+    query = changes_query((2026, 1))
+    assert "(year > 2025 OR (year = 2025 AND month > 10))" in query
+    assert "(year < 2026 OR (year = 2026 AND month <= 1))" in query
+
+
+def test_changes_since_changes_with_each_snapshot():
+    # A new monthly build must not be answered from the previous month's cache
+    assert changes_query((2026, 1)) != changes_query((2026, 2))
+
+
+def test_changes_summary_since_is_bounded_by_the_snapshot():
+    query = lambda_function.format_query(
+        path="/changes", snapshot=(2026, 2), since=(2025, 10)
+    )
+    assert query.startswith("SELECT scope, code")
+    assert "(year < 2026 OR (year = 2026 AND month <= 2))" in query
+
+
+def test_snapshot_is_pinned_without_since():
+    query = lambda_function.format_query(
+        path="/changes", snapshot=(2026, 1), airline_code="AS"
+    )
+    assert "year = 2026 AND month = 1 AND airline_code = 'AS'" in query
@@ -0,0 +1,79 @@
+"""
+Publishing a month's Glue partitions, the Lambda treats the newest airlines
+partition as the latest complete snapshot
+"""
+
+import threading
+
+import create_routes
+import pytest
+
+
+class RecordingGlue:
+    """Records batch_create_partition calls, failing every partition of `failing`"""
+
+    def __init__(self, failing: str = None):
+        self.failing = failing
+        self.registered = []
+        self.lock = threading.Lock()
+
+    def get_table(self, DatabaseName: str, Name: str) -> dict:
+        return {"Table": {"StorageDescriptor": {"Location": f"s3://bucket/{Name}/"}}}
+
+    def batch_create_partition(
+        self, DatabaseName: str, TableName: str, PartitionInputList: list
+    ) -> dict:
+        with self.lock:
+            self.registered.append(TableName)
+        if TableName != self.failing:
+            return {"Errors": []}
+        return {
+            "Errors": [
+                {
+                    "PartitionValues": partition["Values"],
+                    "ErrorDetail": {
+                        "ErrorCode": "InternalServiceException",
+                        "ErrorMessage": "Internal error",
+                    },
+                }
+                for partition in PartitionInputList
+            ]
+        }
+
+
+def written_partitions() -> dict:
+    flights = {
+        ("2026", "2", "AS", f"A{i:02d}"): f"s3://bucket/flights/A{i:02d}/"
+        for i in range(250)
+    }
+    return {
+        "flights": flights,
+        "airports": {("2026", "2"): "s3://bucket/airports/"},
+        "airlines": {("2026", "2"): "s3://bucket/airlines/"},
+        "route_changes": {("2026", "2"): "s3://bucket/route_changes/"},
+        "route_change_summary": {("2026", "2"): "s3://bucket/summary/"},
+    }
+
+
+def publish(monkeypatch, glue: RecordingGlue) -> bool:
+    monkeypatch.setattr(create_routes, "glue", glue)
+    return create_routes.publish_partitions(written_partitions(), 2026, 2)
+
+
+def test_airlines_is_registered_after_every_other_table(monkeypatch):
+    glue = RecordingGlue()
+    assert publish(monkeypatch, glue)
+    assert glue.registered[-1] == "airlines"
+    assert glue.registered.count("airlines") == 1
+    assert glue.registered.count("flights") == 3
+
+
+@pytest.mark.parametrize("failing", ["flights", "airports", "route_changes"])
+def test_failed_table_does_not_publish_the_month(monkeypatch, failing):
+    glue = RecordingGlue(failing=failing)
+    assert not publish(monkeypatch, glue)
+    assert "airlines" not in glue.registered
+
+
+def test_failed_airlines_is_not_published(monkeypatch):
+    assert not publish(monkeypatch, RecordingGlue(failing="airlines"))
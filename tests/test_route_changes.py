@@ -0,0 +1,72 @@
+"""
+Monthly route changes and their per airline and per airport summary
+"""
+
+import create_routes
+import pandas as pd
+
+GEOMETRIES = {
+    "ANC": "POINT (1 1)",
+    "LAX": "POINT (2 2)",
+    "SEA": "POINT (3 3)",
+    "SFO": "POINT (4 4)",
+}
+
+
+def routes_df(routes: list, geometries: dict = GEOMETRIES) -> pd.DataFrame:
+    routes_df = pd.DataFrame(routes, columns=create_routes.ROUTE_KEYS)
+    routes_df["src_geometry"] = routes_df["src_airport"].map(geometries)
+    routes_df["dst_geometry"] = routes_df["dst_airport"].map(geometries)
+    return routes_df
+
+
+def changes(current: list, previous: list, geometries: dict = GEOMETRIES) -> set:
+    changes_df = create_routes.build_route_changes_df(
+        routes_df(current), routes_df(previous, geometries), GEOMETRIES
+    )
+    return set(changes_df.itertuples(index=False, name=None))
+
+
+def test_added_removed_and_unchanged_routes():
+    current = [("AS", "SEA", "LAX"), ("AS", "SEA", "SFO"), ("AS", "SEA", "SFO")]
+    previous = [("AS", "SEA", "LAX"), ("AS", "LAX", "SEA")]
+    assert changes(current, previous) == {
+        ("AS", "SEA", "SFO", "POINT (3 3)", "POINT (4 4)", "added"),
+        ("AS", "LAX", "SEA", "POINT (2 2)", "POINT (3 3)", "removed"),
+    }
+
+
+def test_removed_routes_keep_their_written_geometry():
+    # ANC is no longer served so it isn't among the current geometries
+    previous = routes_df([("AS", "SEA", "ANC")])
+    changes_df = create_routes.build_route_changes_df(
+        routes_df([]), previous, {"SEA": "POINT (3 3)"}
+    )
+    assert changes_df.loc[0, "dst_geometry"] == "POINT (1 1)"
+
+
+def test_unchanged_snapshot_has_no_changes():
+    routes = [("AS", "SEA", "LAX"), ("WN", "LAX", "SFO")]
+    changes_df = create_routes.build_route_changes_df(
+        routes_df(routes), routes_df(routes), GEOMETRIES
+    )
+    assert changes_df.empty
+    assert create_routes.build_route_change_summary_df(changes_df).empty
+
+
+def test_summary_counts_per_airline_and_airport():
+    current = [("AS", "SEA", "LAX"), ("AS", "SEA", "SFO"), ("WN", "LAX", "SFO")]
+    previous = [("AS", "SEA", "LAX"), ("AS", "ANC", "SEA"), ("WN", "SEA", "SFO")]
+    summary_df = create_routes.build_route_change_summary_df(
+        create_routes.build_route_changes_df(
+            routes_df(current), routes_df(previous), GEOMETRIES
+        )
+    )
+    assert set(summary_df.itertuples(index=False, name=None)) == {
+        ("airline", "AS", 1, 1),
+        ("airline", "WN", 1, 1),
+        ("airport", "SEA", 1, 1),
+        ("airport", "LAX", 1, 0),
+        ("airport", "ANC", 0, 1),
+    }
+    assert list(summary_df.dtypes[["added", "removed"]]) == ["int32", "int32"]
@@ -0,0 +1,203 @@
+"""
+Storing each airline and airport pair once, from the monthly build and the
+migration through to the directed routes the Lambda expands them back into
+"""
+
+import json
+import sqlite3
+
+import create_routes
+import lambda_function
+import migrate_route_pairs
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+ROWS = [
+    {
+        "airline_code": "AS",
+        "airport1": "LAX",
+        "airport2": "SEA",
+        "direction": "3",
+        "geometry1": "POINT (3 4)",
+        "geometry2": "POINT (1 2)",
+    },
+    {
+        "airline_code": "AS",
+        "airport1": "JFK",
+        "airport2": "SEA",
+        "direction": "2",
+        "geometry1": "POINT (5 6)",
+        "geometry2": "POINT (1 2)",
+    },
+]
+
+
+def routes(rows: list, src_airport: str = None) -> set:
+    return {
+        (route["src_airport"], route["dst_airport"])
+        for route in lambda_function.expand_route_pairs(rows, src_airport)
+    }
+
+
+def test_expands_every_direction_flown():
+    assert routes(ROWS) == {("LAX", "SEA"), ("SEA", "LAX"), ("SEA", "JFK")}
+
+
+def test_only_expands_directions_from_the_airport():
+    assert routes(ROWS, "SEA") == {("SEA", "LAX"), ("SEA", "JFK")}
+    assert routes(ROWS, "JFK") == set()
+
+
+def test_skips_rows_without_a_direction():
+    # Months still in the directed layout come back with empty pair columns
+    directed = {key: "" for key in ROWS[0]} | {"airline_code": "AS", "airport1": "SEA"}
+    assert routes([directed] + ROWS, "SEA") == {("SEA", "LAX"), ("SEA", "JFK")}
+
+
+# Directed routes as scraped, SEA-ANC is only flown from SEA and ABQ-SEA only
+# into SEA, both from airport1 partitions other than SEA's own
+SCRAPED = [
+    ("AS", "SEA", "LAX"),
+    ("AS", "LAX", "SEA"),
+    ("AS", "SEA", "LAX"),
+    ("AS", "SEA", "ANC"),
+    ("AS", "ABQ", "SEA"),
+    ("AS", "SEA", "YUM"),
+    ("WN", "SEA", "LAX"),
+    ("WN", "LAX", "DEN"),
+    (None, "SEA", "PDX"),
+    ("AS", None, "PDX"),
+    ("AS", "SEA", None),
+]
+DIRECTED = [route for route in SCRAPED if None not in route]
+GEOMETRIES = {
+    airport: f"POINT ({i} {i + 0.5})"
+    for i, airport in enumerate(["ABQ", "ANC", "DEN", "LAX", "PDX", "SEA", "YUM"])
+}
+
+
+def bitwise_and(x: int, y: int) -> int:
+    return x & y
+
+
+def scraped_pairs_df(tmp_path) -> pd.DataFrame:
+    """Folds the scraped routes through a spill file the way the monthly job does"""
+    accumulator = create_routes.RouteAccumulator(
+        str(tmp_path / "routes.parquet"), batch_size=3
+    )
+    accumulator.extend(SCRAPED)
+    accumulator.close()
+    return create_routes.build_route_pairs_df(accumulator.iter_batches())
+
+
+def migrated_pairs_df() -> pd.DataFrame:
+    routes_df = pd.DataFrame(DIRECTED, columns=create_routes.ROUTE_KEYS)
+    return migrate_route_pairs.build_pairs_from_directed(routes_df)
+
+
+def flights_db(pairs_df: pd.DataFrame) -> sqlite3.Connection:
+    """Loads the written flights rows into SQLite so the Athena SQL can run on them"""
+    db = sqlite3.connect(":memory:")
+    db.row_factory = sqlite3.Row
+    db.create_function("bitwise_and", 2, bitwise_and)
+    rows = pa.Table.from_batches(
+        create_routes.add_route_geometries(batch, GEOMETRIES, 2026, 1)
+        for batch in pa.Table.from_pandas(pairs_df, preserve_index=False).to_batches()
+    ).to_pandas()
+    rows.to_sql(lambda_function.FLIGHTS_TABLE, db, index=False)
+    return db
+
+
+def features(routes: list) -> list:
+    collection = lambda_function.build_line_geojson(routes)
+    return sorted(
+        json.dumps(feature, sort_keys=True) for feature in collection["features"]
+    )
+
+
+def directed_features(src_airport: str, airline_code: str = None) -> list:
+    """GeoJSON of the directed layout's `src_airport = X` query"""
+    return features(
+        [
+            {
+                "airline_code": airline,
+                "src_airport": src,
+                "dst_airport": dst,
+                "src_geometry": GEOMETRIES[src],
+                "dst_geometry": GEOMETRIES[dst],
+            }
+            for airline, src, dst in sorted(set(DIRECTED))
+            if src == src_airport and airline_code in [None, airline]
+        ]
+    )
+
+
+def pair_features(
+    pairs_df: pd.DataFrame, src_airport: str, airline_code: str = None
+) -> list:
+    route_index = json.loads(json.dumps(create_routes.build_route_index(pairs_df)))
+    query = lambda_function.format_query(
+        path="/routes",
+        snapshot=(2026, 1),
+        src_airport=src_airport,
+        airline_code=airline_code,
+        route_index=route_index,
+    )
+    rows = [dict(row) for row in flights_db(pairs_df).execute(query)]
+    return features(lambda_function.expand_route_pairs(rows, src_airport))
+
+
+def test_build_folds_directions_and_drops_null_keys(tmp_path):
+    pairs_df = scraped_pairs_df(tmp_path)
+    pairs = {
+        (airline, airport1, airport2): direction
+        for airline, airport1, airport2, direction in pairs_df.astype(
+            {key: str for key in create_routes.PAIR_KEYS}
+        ).itertuples(index=False)
+    }
+    assert pairs == {
+        ("AS", "LAX", "SEA"): 3,
+        ("AS", "ANC", "SEA"): 2,
+        ("AS", "ABQ", "SEA"): 1,
+        ("AS", "SEA", "YUM"): 1,
+        ("WN", "LAX", "SEA"): 2,
+        ("WN", "DEN", "LAX"): 2,
+    }
+
+
+def test_route_index_lists_the_other_airport1_partitions(tmp_path):
+    route_index = create_routes.build_route_index(scraped_pairs_df(tmp_path))
+    assert route_index["SEA"] == ["ABQ", "ANC", "LAX"]
+    assert "ABQ" not in route_index
+
+
+def test_migration_matches_the_monthly_build(tmp_path):
+    pd.testing.assert_frame_equal(
+        migrated_pairs_df()
+        .astype(str)
+        .sort_values(create_routes.PAIR_KEYS)
+        .reset_index(drop=True),
+        scraped_pairs_df(tmp_path)
+        .astype(str)
+        .sort_values(create_routes.PAIR_KEYS)
+        .reset_index(drop=True),
+    )
+
+
+@pytest.mark.parametrize(
+    "src_airport, airline_code",
+    [
+        ("SEA", None),
+        ("SEA", "AS"),
+        ("LAX", None),
+        ("ANC", None),
+        ("ABQ", None),
+        ("DEN", "WN"),
+        ("YUM", None),
+    ],
+)
+def test_airport_routes_match_the_directed_layout(tmp_path, src_airport, airline_code):
+    expected = directed_features(src_airport, airline_code)
+    for pairs_df in [scraped_pairs_df(tmp_path), migrated_pairs_df()]:
+        assert pair_features(pairs_df, src_airport, airline_code) == expected